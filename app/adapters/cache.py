@@ -0,0 +1,274 @@
+# app/adapters/cache.py
+# The following code defines the response cache used by adapters to short-circuit identical,
+# deterministic requests. Storage is pluggable: an in-process LRU for single-worker setups and
+# Redis for deployments running several workers. A second, embedding-based tier catches
+# rephrasings of prompts that were already answered.
+
+
+import asyncio
+import hashlib
+import math
+import operator
+import os
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Tuple
+
+import orjson
+
+from app.core.logger import console
+
+try:
+    import redis.asyncio as redis_asyncio
+except ImportError:  # Redis support is optional.
+    redis_asyncio = None
+
+
+class CacheBackend(ABC):
+    """
+    Abstract Base Class (Interface) for cache storage backends.
+    """
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[Any]:
+        pass
+
+    @abstractmethod
+    async def set(self, key: str, value: Any, ttl: int) -> None:
+        pass
+
+    @abstractmethod
+    async def delete(self, key: str) -> None:
+        pass
+
+    async def aclose(self) -> None:
+        """Releases any resources held by the backend."""
+        pass
+
+
+class InMemoryBackend(CacheBackend):
+    """In-process LRU cache with per-entry expiry."""
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+    async def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: Any, ttl: int) -> None:
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    async def delete(self, key: str) -> None:
+        self._entries.pop(key, None)
+
+
+class RedisBackend(CacheBackend):
+    """Redis-backed cache shared by all workers. Requires the optional 'redis' package."""
+
+    # Values are tagged so raw bytes and JSON documents round-trip unchanged.
+    _BYTES_TAG = b"b"
+    _JSON_TAG = b"j"
+
+    def __init__(self, url: str, prefix: str = "llm-bridge:"):
+        if redis_asyncio is None:
+            raise RuntimeError("Redis cache backend requested but the 'redis' package is not installed.")
+        self._redis = redis_asyncio.from_url(url)
+        self._prefix = prefix
+
+    async def get(self, key: str) -> Optional[Any]:
+        raw = await self._redis.get(self._prefix + key)
+        if raw is None:
+            return None
+        if raw[:1] == self._BYTES_TAG:
+            return raw[1:]
+        return orjson.loads(raw[1:])
+
+    async def set(self, key: str, value: Any, ttl: int) -> None:
+        if isinstance(value, bytes):
+            raw = self._BYTES_TAG + value
+        else:
+            raw = self._JSON_TAG + orjson.dumps(value)
+        await self._redis.set(self._prefix + key, raw, ex=ttl)
+
+    async def delete(self, key: str) -> None:
+        await self._redis.delete(self._prefix + key)
+
+    async def aclose(self) -> None:
+        await self._redis.aclose()
+
+
+class LLMCache:
+    """
+    Response cache for LLM requests.
+    Wraps a CacheBackend, derives keys from request payloads and never lets a backend
+    failure break the request path: errors are logged and treated as cache misses.
+    """
+
+    def __init__(self, backend: Optional[CacheBackend], ttl: int = 3600):
+        self.backend = backend
+        self.ttl = ttl
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    @classmethod
+    def from_env(cls) -> "LLMCache":
+        """
+        Builds the cache from environment variables:
+        LLM_BRIDGE_CACHE ("memory", "redis" or "off"), LLM_BRIDGE_CACHE_TTL (seconds),
+        LLM_BRIDGE_CACHE_MAXSIZE (in-memory entries) and LLM_BRIDGE_REDIS_URL.
+        """
+        kind = os.getenv("LLM_BRIDGE_CACHE", "memory").lower()
+        ttl = int(os.getenv("LLM_BRIDGE_CACHE_TTL", "3600"))
+        if kind == "off":
+            return cls(None, ttl)
+        if kind == "redis":
+            url = os.getenv("LLM_BRIDGE_REDIS_URL", "redis://localhost:6379/0")
+            return cls(RedisBackend(url), ttl)
+        if kind == "memory":
+            return cls(InMemoryBackend(int(os.getenv("LLM_BRIDGE_CACHE_MAXSIZE", "1024"))), ttl)
+        raise ValueError(f"Unknown cache backend '{kind}' in LLM_BRIDGE_CACHE.")
+
+    @staticmethod
+    def make_key(fields: Dict[str, Any], messages_json: bytes = b"") -> str:
+        """
+        Hashes the normalized request fields that determine the response, followed by
+        the already-serialized messages.
+        """
+        digest = hashlib.sha256(orjson.dumps(fields, option=orjson.OPT_SORT_KEYS))
+        digest.update(messages_json)
+        return digest.hexdigest()
+
+    async def get(self, key: str) -> Optional[Any]:
+        if self.backend is None:
+            return None
+        try:
+            return await self.backend.get(key)
+        except Exception as e:
+            console.warning("Cache lookup failed, treating as a miss: %r", e)
+            return None
+
+    async def set(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
+        if self.backend is None:
+            return
+        try:
+            await self.backend.set(key, value, self.ttl if ttl is None else ttl)
+        except Exception as e:
+            console.warning("Cache store failed: %r", e)
+
+    async def delete(self, key: str) -> None:
+        if self.backend is None:
+            return
+        try:
+            await self.backend.delete(key)
+        except Exception as e:
+            console.warning("Cache delete failed: %r", e)
+
+    async def aclose(self) -> None:
+        if self.backend is not None:
+            await self.backend.aclose()
+
+
+class SemanticCache:
+    """
+    Second-tier cache that matches prompts by embedding similarity instead of exact bytes.
+    Entries live in an in-process store partitioned by a caller-supplied key, which must
+    include everything that makes a response unsafe to share (model, system prompt, user),
+    so a lookup can never return another tenant's response. Partitions are evicted least
+    recently used first once there are more than max_partitions of them.
+    """
+
+    def __init__(
+        self,
+        embedding_model: Optional[str],
+        threshold: float = 0.97,
+        maxsize: int = 256,
+        max_partitions: int = 1024,
+        timeout: float = 5.0,
+    ):
+        self.embedding_model = embedding_model
+        self.threshold = threshold
+        self.maxsize = maxsize
+        self.max_partitions = max_partitions
+        # Seconds to wait for the upstream /embeddings call before skipping the tier.
+        self.timeout = timeout
+        self._partitions: "OrderedDict[Hashable, List[Tuple[List[float], Any]]]" = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return self.embedding_model is not None
+
+    @classmethod
+    def from_env(cls) -> "SemanticCache":
+        """
+        Builds the cache from environment variables. It is disabled unless
+        LLM_BRIDGE_SEMANTIC_CACHE_MODEL names an embedding model served by the upstream;
+        LLM_BRIDGE_SEMANTIC_CACHE_THRESHOLD (cosine similarity),
+        LLM_BRIDGE_SEMANTIC_CACHE_MAXSIZE (entries per partition),
+        LLM_BRIDGE_SEMANTIC_CACHE_PARTITIONS (partitions kept) and
+        LLM_BRIDGE_SEMANTIC_CACHE_TIMEOUT (seconds for the embedding call) tune it.
+        """
+        return cls(
+            embedding_model=os.getenv("LLM_BRIDGE_SEMANTIC_CACHE_MODEL") or None,
+            threshold=float(os.getenv("LLM_BRIDGE_SEMANTIC_CACHE_THRESHOLD", "0.97")),
+            maxsize=int(os.getenv("LLM_BRIDGE_SEMANTIC_CACHE_MAXSIZE", "256")),
+            max_partitions=int(os.getenv("LLM_BRIDGE_SEMANTIC_CACHE_PARTITIONS", "1024")),
+            timeout=float(os.getenv("LLM_BRIDGE_SEMANTIC_CACHE_TIMEOUT", "5")),
+        )
+
+    @staticmethod
+    def _normalize(vector: Sequence[float]) -> List[float]:
+        norm = math.hypot(*vector)
+        if norm == 0.0:
+            return list(vector)
+        return [x / norm for x in vector]
+
+    @staticmethod
+    def _best_match(entries: List[Tuple[List[float], Any]], embedding: Sequence[float]) -> Tuple[float, Any]:
+        query = SemanticCache._normalize(embedding)
+        best_score, best_value = -1.0, None
+        for vector, value in entries:
+            score = sum(map(operator.mul, query, vector))
+            if score > best_score:
+                best_score, best_value = score, value
+        return best_score, best_value
+
+    async def lookup(self, partition: Hashable, embedding: Sequence[float]) -> Optional[Any]:
+        """
+        Returns the stored response closest to the embedding if it clears the threshold.
+        The similarity scan is O(entries x dimensions), so it runs in a worker thread over a
+        snapshot of the partition instead of blocking the event loop.
+        """
+        entries = self._partitions.get(partition)
+        if not entries:
+            return None
+        self._partitions.move_to_end(partition)
+        best_score, best_value = await asyncio.to_thread(self._best_match, list(entries), embedding)
+        return best_value if best_score >= self.threshold else None
+
+    def store(self, partition: Hashable, embedding: Sequence[float], value: Any) -> None:
+        """Adds a response to the partition, dropping the oldest entry when it is full."""
+        entries = self._partitions.get(partition)
+        if entries is None:
+            entries = self._partitions[partition] = []
+            while len(self._partitions) > self.max_partitions:
+                self._partitions.popitem(last=False)
+        else:
+            self._partitions.move_to_end(partition)
+        entries.append((self._normalize(embedding), value))
+        if len(entries) > self.maxsize:
+            del entries[0]
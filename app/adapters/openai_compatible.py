@@ -7,59 +7,329 @@
 
 # app/adapters/openai_compatible.py
 
+import asyncio
+import contextlib
+import hashlib
+import os
+import time
 import httpx
+import orjson
 from typing import AsyncGenerator, Any, Dict, Union
 from app.adapters.base import BaseAdapter
+from app.adapters.cache import LLMCache, SemanticCache
+from app.adapters.resilience import AdaptiveTimeout, CircuitBreaker, CircuitOpenError
+from app.core.http_client import get_http_client
 from app.core.schemas import StandardizedChatRequest
 from app.core.logger import console
 
+# Fields of StandardizedChatRequest forwarded to the upstream API besides the messages.
+_PAYLOAD_FIELDS = {"model", "stream", "tools", "tool_choice", "temperature", "max_tokens"}
+
+# Marks the end of an upstream stream in the relay queue.
+_STREAM_END = object()
+
+# The frame that ends an OpenAI stream, and how much of the relayed tail to check for it
+# (allowing for trailing whitespace and CRLF framing).
+_SSE_DONE = b"data: [DONE]"
+_SSE_DONE_TAIL_LEN = 32
+
+# Size of the slices a cached stream is replayed in.
+_REPLAY_CHUNK_SIZE = 4096
+
+
 class OpenAICompatibleAdapter(BaseAdapter):
     """Adapter for OpenAI's API and other OpenAI-compatible services."""
 
-    def __init__(self, api_key: str, base_url: str):
+    # Shared response cache for deterministic requests, built from the environment on first use.
+    _cache: LLMCache | None = None
+    _semantic_cache: SemanticCache | None = None
+    # Upstream health, tracked per (endpoint, model) and shared by all instances.
+    _breaker: CircuitBreaker | None = None
+    _timeouts = AdaptiveTimeout()
+
+    def __init__(self, api_key: str, base_url: str, client: httpx.AsyncClient | None = None):
         super().__init__(api_key, base_url)
+        # The connection pool is shared app-wide; it is injected by the model manager.
+        self._client = client if client is not None else get_http_client()
+        # Constant per adapter, so build them once instead of on every request.
+        self._headers = {
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json",
+        }
+        self._chat_url = f"{base_url.rstrip('/')}/chat/completions"
+        self._embeddings_url = f"{base_url.rstrip('/')}/embeddings"
+        self._stream_buffer_chunks = int(os.getenv("LLM_BRIDGE_STREAM_BUFFER_CHUNKS", "8"))
+
+    @classmethod
+    def get_cache(cls) -> LLMCache:
+        """Returns the shared response cache, creating it on first use."""
+        if cls._cache is None:
+            cls._cache = LLMCache.from_env()
+        return cls._cache
+
+    @classmethod
+    def get_semantic_cache(cls) -> SemanticCache:
+        """Returns the shared semantic cache, creating it on first use."""
+        if cls._semantic_cache is None:
+            cls._semantic_cache = SemanticCache.from_env()
+        return cls._semantic_cache
+
+    @classmethod
+    def get_breaker(cls) -> CircuitBreaker:
+        """Returns the shared circuit breaker, creating it on first use."""
+        if cls._breaker is None:
+            cls._breaker = CircuitBreaker.from_env()
+        return cls._breaker
+
+    @classmethod
+    async def aclose_cache(cls) -> None:
+        """Closes the shared response cache, if one was created."""
+        if cls._cache is not None:
+            await cls._cache.aclose()
+            cls._cache = None
 
     async def chat_completions(
         self,
         request: StandardizedChatRequest,
     ) -> Union[Dict[str, Any], AsyncGenerator[bytes, None]]:
         """Forwards the chat completion request, now including tools."""
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json",
-        }
-        
-        # Build a payload that now includes tools if they exist.
-        payload = {
-            "model": request.model,
-            "messages": [msg.dict(exclude_none=True) for msg in request.messages],
-            "stream": request.stream,
-        }
-        if request.tools:
-            payload["tools"] = [t.dict() for t in request.tools]
-        if request.tool_choice:
-            payload["tool_choice"] = request.tool_choice
-        if request.temperature is not None:
-            payload["temperature"] = request.temperature
+        if request._raw_body is not None and not ("tools" in request.model_fields_set and not request.tools):
+            # The client already sent OpenAI-format JSON: forward it verbatim and skip
+            # payload assembly entirely. (An empty or null tools field is the one thing
+            # that has to be rewritten, since upstreams reject it.)
+            body = request._raw_body
+            cache_fields = {"stream": request.stream}
+            cache_bytes = body
+        else:
+            # Messages carry their own cached JSON (see ChatMessage.to_json), so only the small
+            # top-level fields are serialized here and the messages are spliced in as bytes.
+            # Unset optional fields (tools, tool_choice, temperature, ...) are dropped by exclude_none.
+            payload = request.model_dump(include=_PAYLOAD_FIELDS, exclude_none=True, mode="json")
+            if not request.tools:
+                # Upstreams reject an empty tools array.
+                payload.pop("tools", None)
+            messages_json = b",".join([msg.to_json() for msg in request.messages])
+            # payload always contains "model", so the spliced object stays well-formed.
+            body = b'{"messages":[' + messages_json + b"]," + orjson.dumps(payload)[1:]
+            cache_fields = {
+                "model": payload["model"],
+                "tools": payload.get("tools"),
+                "tool_choice": payload.get("tool_choice"),
+                "max_tokens": payload.get("max_tokens"),
+                "stream": request.stream,
+            }
+            cache_bytes = messages_json
+
+        # Identical requests at temperature 0 are answered from the cache without
+        # touching the network.
+        cache = self.get_cache()
+        cache_key = None
+        if cache.enabled and request.temperature == 0:
+            cache_key = LLMCache.make_key(cache_fields, cache_bytes)
+            cached = await cache.get(cache_key)
+            if cached is not None:
+                console.info("Cache hit for model: %s", request.model)
+                return self._replay_stream(cached) if request.stream else cached
+
+        # Second tier: a near-duplicate of an earlier prompt. Restricted to plain,
+        # deterministic, non-streaming chats from an identified user, where a shared
+        # answer is safe; anonymous callers would all land in one partition.
+        semantic_cache = self.get_semantic_cache()
+        semantic_key, embedding = None, None
+        if semantic_cache.enabled and cache_key is not None and not request.stream and not request.tools:
+            user = self._cache_user(request)
+            if user is not None:
+                semantic_key, embedding = await self._semantic_lookup_key(request, semantic_cache, user)
+            if semantic_key is not None:
+                cached = await semantic_cache.lookup(semantic_key, embedding)
+                if cached is not None:
+                    console.info("Semantic cache hit for model: %s", request.model)
+                    return cached
+
+        client = self._client
+        # Fail fast while the upstream is known to be unhealthy, and size the read timeout
+        # from its recent latency instead of always waiting the full five minutes.
+        breaker = self.get_breaker()
+        health_key = (self._chat_url, request.model)
+        breaker.check(health_key)
+        latency_key = self._latency_key(request)
+        timeout = self._timeouts.timeout_for(latency_key)
+        started = time.monotonic()
+
+        try:
+            if request.stream:
+                # No context manager here: the endpoint consumes the stream after this
+                # method returns, so _stream_response owns the response and closes it.
+                http_request = client.build_request(
+                    "POST", self._chat_url, headers=self._headers, content=body, timeout=timeout,
+                )
+                response = await client.send(http_request, stream=True)
+                response.raise_for_status()
+                self._record_success(health_key, latency_key, started)
+                return self._stream_response(response, cache_key)
+            else:
+                response = await client.post(self._chat_url, headers=self._headers, content=body, timeout=timeout)
+                response.raise_for_status()
+                self._record_success(health_key, latency_key, started)
+                result = orjson.loads(response.content)
+                if cache_key is not None:
+                    await cache.set(cache_key, result)
+                if semantic_key is not None:
+                    semantic_cache.store(semantic_key, embedding, result)
+                return result
         
-        timeout_config = httpx.Timeout(300.0, connect=60.0)
-        api_url = f"{self.base_url}/chat/completions"
+        except httpx.HTTPStatusError as e:
+            # Client errors say nothing about upstream health; throttling and 5xx do.
+            if e.response.status_code >= 500 or e.response.status_code == 429:
+                breaker.record_failure(health_key)
+            error_body = await e.response.aread()
+            console.error("Downstream API error (%s): %s", e.response.status_code, error_body.decode(errors="replace"))
+            raise
+        except httpx.ReadTimeout:
+            # A timeout we tightened ourselves may just be an unusually long completion,
+            # so only the full default timeout counts against the upstream's health.
+            if timeout.read is not None and timeout.read < self._timeouts.default:
+                console.warning("Upstream read timed out after the adaptive limit of %.1fs", timeout.read)
+            else:
+                breaker.record_failure(health_key)
+            raise
+        except httpx.TransportError:
+            breaker.record_failure(health_key)
+            raise
 
-        async with httpx.AsyncClient(timeout=timeout_config) as client:
+    def _latency_key(self, request: StandardizedChatRequest) -> tuple | None:
+        """
+        Returns the key latency samples are tracked under, or None if the request should
+        always get the default timeout.
+        Streams are excluded: their read timeout applies to every gap between chunks, which
+        the time to the response headers says nothing about. Non-streaming requests are only
+        comparable when max_tokens bounds the length of the generation.
+        """
+        if request.stream or request.max_tokens is None:
+            return None
+        return (self._chat_url, request.model, request.max_tokens)
+
+    def _record_success(self, health_key: tuple, latency_key: tuple | None, started: float) -> None:
+        self.get_breaker().record_success(health_key)
+        if latency_key is not None:
+            self._timeouts.observe(latency_key, time.monotonic() - started)
+
+    @staticmethod
+    def _cache_user(request: StandardizedChatRequest) -> str | None:
+        """
+        Returns the caller identity that partitions the semantic cache: set by the endpoint,
+        or else the "user" field of a forwarded OpenAI body.
+        """
+        if request._cache_user is not None:
+            return request._cache_user
+        if request._raw_body is not None:
+            user = orjson.loads(request._raw_body).get("user")
+            if user is not None:
+                return str(user)
+        return None
+
+    async def _semantic_lookup_key(
+        self,
+        request: StandardizedChatRequest,
+        semantic_cache: SemanticCache,
+        user: str,
+    ) -> tuple[tuple | None, list[float] | None]:
+        """
+        Embeds the conversation through the upstream /embeddings endpoint and returns the
+        partition key (model, system prompt hash, user) along with the embedding.
+        Returns (None, None) if the embedding call fails or its circuit is open, so the
+        request simply bypasses the semantic tier. The call has its own short timeout,
+        since it only ever saves time when it is fast.
+        """
+        breaker = self.get_breaker()
+        health_key = (self._embeddings_url, semantic_cache.embedding_model)
+        try:
+            breaker.check(health_key)
+        except CircuitOpenError:
+            return None, None
+        system_text = "\n".join(m.content or "" for m in request.messages if m.role == "system")
+        conversation = "\n".join(m.content or "" for m in request.messages if m.role != "system")
+        body = orjson.dumps({"model": semantic_cache.embedding_model, "input": conversation})
+        try:
+            response = await self._client.post(
+                self._embeddings_url, headers=self._headers, content=body, timeout=semantic_cache.timeout,
+            )
+            response.raise_for_status()
+            breaker.record_success(health_key)
+            embedding = orjson.loads(response.content)["data"][0]["embedding"]
+        except (httpx.HTTPError, KeyError, IndexError, orjson.JSONDecodeError) as e:
+            status = e.response.status_code if isinstance(e, httpx.HTTPStatusError) else None
+            if isinstance(e, httpx.TransportError) or (status is not None and (status >= 500 or status == 429)):
+                breaker.record_failure(health_key)
+            console.warning("Semantic cache embedding failed, skipping: %r", e)
+            return None, None
+        system_hash = hashlib.sha256(system_text.encode("utf-8")).hexdigest()
+        return (request.model, system_hash, user), embedding
+
+    async def _stream_response(
+        self,
+        response: httpx.Response,
+        cache_key: str | None = None,
+    ) -> AsyncGenerator[bytes, None]:
+        """
+        Relays an upstream stream through a bounded queue.
+        A background task reads from the upstream while this generator hands chunks to the
+        client, so buffered memory is capped at LLM_BRIDGE_STREAM_BUFFER_CHUNKS chunks.
+        Upstream errors are re-raised here instead of silently ending the stream, and the
+        upstream response is always closed, including when the client disconnects.
+        With a cache_key, the relayed bytes are also stored once the stream completes.
+        """
+        # SSE is forwarded verbatim, so skip httpx's decoder unless the upstream
+        # actually compressed the body. No chunk_size: re-chunking would hold
+        # tokens back until the buffer fills.
+        if response.headers.get("content-encoding", "identity") == "identity":
+            chunks = response.aiter_raw()
+        else:
+            chunks = response.aiter_bytes()
+
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self._stream_buffer_chunks)
+
+        async def produce():
             try:
-                if request.stream:
-                    async with client.stream("POST", api_url, headers=headers, json=payload) as response:
-                        response.raise_for_status()
-                        async def generator():
-                            async for chunk in response.aiter_bytes():
-                                yield chunk
-                        return generator()
-                else:
-                    response = await client.post(api_url, headers=headers, json=payload)
-                    response.raise_for_status()
-                    return response.json()
-            
-            except httpx.HTTPStatusError as e:
-                error_body = await e.response.aread()
-                console.error(f"Downstream API error ({e.response.status_code}): {error_body.decode()}")
-                raise
\ No newline at end of file
+                async for chunk in chunks:
+                    await queue.put(chunk)
+            except Exception as e:
+                console.error("Upstream stream terminated with an error: %r", e)
+                await queue.put(e)
+            else:
+                await queue.put(_STREAM_END)
+
+        buffer = bytearray() if cache_key is not None else None
+        producer = asyncio.create_task(produce())
+        try:
+            while True:
+                item = await queue.get()
+                if item is _STREAM_END:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                if buffer is not None:
+                    buffer.extend(item)
+                    # Store as soon as the terminating frame has arrived: consumers such as
+                    # the Anthropic translator stop reading at [DONE] and never see the end.
+                    if bytes(buffer[-_SSE_DONE_TAIL_LEN:]).rstrip().endswith(_SSE_DONE):
+                        await self.get_cache().set(cache_key, bytes(buffer))
+                        buffer = None
+                yield item
+            # Only complete streams are cached; errors and disconnects never get here.
+            if buffer is not None:
+                await self.get_cache().set(cache_key, bytes(buffer))
+        finally:
+            # Let the cancelled producer finish before closing, so the close never races
+            # a read that is still in flight.
+            producer.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await producer
+            await response.aclose()
+
+    @staticmethod
+    async def _replay_stream(data: bytes) -> AsyncGenerator[bytes, None]:
+        """Replays a cached stream in small chunks, yielding to the event loop between them."""
+        for start in range(0, len(data), _REPLAY_CHUNK_SIZE):
+            yield data[start:start + _REPLAY_CHUNK_SIZE]
+            await asyncio.sleep(0)
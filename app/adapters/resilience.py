@@ -0,0 +1,111 @@
+# app/adapters/resilience.py
+# The following code protects the proxy from unhealthy upstreams.
+# A circuit breaker fails fast once an endpoint keeps erroring, and an adaptive timeout
+# derived from recently observed latency keeps slow upstreams from pinning worker tasks.
+
+
+import math
+import os
+import time
+from collections import deque
+from typing import Deque, Dict, Hashable
+
+import httpx
+
+
+class CircuitOpenError(Exception):
+    """Raised when requests to an upstream are being short-circuited."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Upstream is temporarily unavailable; retry in {math.ceil(retry_after)}s.")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Per-upstream circuit breaker.
+    After fail_threshold consecutive failures the circuit opens and requests are rejected
+    for cooldown seconds. Afterwards requests are let through again; one more failure
+    re-opens the circuit immediately, while a success closes it.
+    """
+
+    def __init__(self, fail_threshold: int = 5, cooldown: float = 30.0):
+        self.fail_threshold = fail_threshold
+        self.cooldown = cooldown
+        self._failures: Dict[Hashable, int] = {}
+        self._open_until: Dict[Hashable, float] = {}
+
+    @classmethod
+    def from_env(cls) -> "CircuitBreaker":
+        """
+        Builds the breaker from LLM_BRIDGE_BREAKER_FAILURES (consecutive failures before
+        opening; 0 disables the breaker) and LLM_BRIDGE_BREAKER_COOLDOWN (seconds).
+        """
+        return cls(
+            fail_threshold=int(os.getenv("LLM_BRIDGE_BREAKER_FAILURES", "5")),
+            cooldown=float(os.getenv("LLM_BRIDGE_BREAKER_COOLDOWN", "30")),
+        )
+
+    def check(self, key: Hashable) -> None:
+        """Raises CircuitOpenError if the circuit for key is open."""
+        open_until = self._open_until.get(key)
+        if open_until is not None:
+            remaining = open_until - time.monotonic()
+            if remaining > 0:
+                raise CircuitOpenError(remaining)
+
+    def record_success(self, key: Hashable) -> None:
+        self._failures.pop(key, None)
+        self._open_until.pop(key, None)
+
+    def record_failure(self, key: Hashable) -> None:
+        if self.fail_threshold <= 0:
+            return
+        failures = self._failures.get(key, 0) + 1
+        self._failures[key] = failures
+        if failures >= self.fail_threshold:
+            self._open_until[key] = time.monotonic() + self.cooldown
+
+
+class AdaptiveTimeout:
+    """
+    Derives per-upstream read timeouts from a sliding window of observed latencies.
+    Until min_samples observations exist the default timeout is used; afterwards the read
+    timeout is multiplier x p99, clamped between floor and the default.
+    """
+
+    def __init__(
+        self,
+        default: float = 300.0,
+        connect: float = 5.0,
+        window: int = 100,
+        min_samples: int = 20,
+        multiplier: float = 5.0,
+        floor: float = 5.0,
+    ):
+        self.default = default
+        self.connect = connect
+        self.window = window
+        self.min_samples = min_samples
+        self.multiplier = multiplier
+        self.floor = floor
+        self._samples: Dict[Hashable, Deque[float]] = {}
+
+    def observe(self, key: Hashable, seconds: float) -> None:
+        samples = self._samples.get(key)
+        if samples is None:
+            samples = self._samples[key] = deque(maxlen=self.window)
+        samples.append(seconds)
+
+    def p99(self, key: Hashable) -> float | None:
+        samples = self._samples.get(key)
+        if samples is None or len(samples) < self.min_samples:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, math.ceil(0.99 * len(ordered)) - 1)]
+
+    def timeout_for(self, key: Hashable | None) -> httpx.Timeout:
+        """Returns the timeout to use for the next request to key; None gets the default."""
+        p99 = None if key is None else self.p99(key)
+        read = self.default if p99 is None else min(max(self.multiplier * p99, self.floor), self.default)
+        return httpx.Timeout(self.default, connect=self.connect, read=read)
@@ -6,12 +6,15 @@
 # Version: 0.1.0
 
 
-import json
+import asyncio
+import contextlib
 import os
-import uuid
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import StreamingResponse, JSONResponse
-from typing import AsyncGenerator, Union, List, Dict, Any
+import re
+
+import orjson
+from fastapi import APIRouter
+from fastapi.responses import StreamingResponse
+from typing import AsyncGenerator, Callable, Optional, Union, List, Dict, Any
 
 from app.core.schemas import (
     StandardizedChatRequest, ChatMessage, Tool, Function,
@@ -19,49 +22,156 @@ from app.core.schemas import (
 )
 from app.services.model_manager import get_adapter
 from app.core.logger import console
+from app.core.responses import ORJSONResponse, wrap_response
 
 router = APIRouter()
 
+_SSE_DATA_PREFIX = b"data: "
+_SSE_DONE = b"data: [DONE]"
+
+# Constant parts of the outgoing Anthropic events; only the JSON payload varies.
+_EVT_CBD = b"event: content_block_delta\ndata: "
+_EVT_CBS = b"event: content_block_start\ndata: "
+_EVT_END = b"\n\n"
+_MSG_STOP = b'event: message_stop\ndata: {"type":"message_stop"}\n\n'
+# message_start only varies in the message id and the (JSON-quoted) model name.
+_MSG_START_TMPL = (
+    b'event: message_start\ndata: {"type":"message_start","message":{"id":"%s","type":"message",'
+    b'"role":"assistant","content":[],"model":%s,"stop_reason":null,"stop_sequence":null,'
+    b'"usage":{"input_tokens":0,"output_tokens":0}}}\n\n'
+)
+# Text deltas differ only in the text itself, so everything around it is pre-encoded.
+_TEXT_DELTA_HEAD = _EVT_CBD + b'{"type":"content_block_delta","index":0,"delta":{"type":"text_delta","text":'
+_TEXT_DELTA_TAIL = b"}}" + _EVT_END
+
+# Matches the content string of a delta that holds no nested objects (text-only deltas).
+_DELTA_CONTENT_RE = re.compile(rb'"delta":\s*\{[^{}]*?"content":\s*"((?:[^"\\]|\\.)*)"')
+
+# Read once at import; the model manager has already loaded .env by this point.
+DEFAULT_MODEL_OVERRIDE = os.getenv("DEFAULT_MODEL_OVERRIDE")
+# Window (ms) for merging consecutive text deltas into one event; 0 sends every delta as is.
+STREAM_COALESCE_MS = float(os.getenv("STREAM_COALESCE_MS", "0"))
+# Merged text is flushed early once it reaches this many characters.
+_COALESCE_MAX_CHARS = 64
+# Yielded by _with_flush_ticks when the coalescing window expires without new data.
+_FLUSH_TICK = object()
+
+def _flatten_text(content: Union[str, List[AnthropicContentBlock]]) -> str:
+    """Collapses Anthropic content (plain string or list of blocks) into its text."""
+    if isinstance(content, str):
+        return content
+    # Most messages carry a single text block; return it without building a join.
+    if len(content) == 1:
+        block = content[0]
+        return (block.text or "") if block.type == "text" else ""
+    return "".join(b.text for b in content if b.type == "text" and b.text)
+
+def _decode_json_string(raw: bytes) -> str:
+    """Decodes the body of a JSON string literal, leaving unescaped ones to a plain UTF-8 decode."""
+    if b"\\" not in raw:
+        return raw.decode()
+    return orjson.loads(b'"' + raw + b'"')
+
 def _transform_anthropic_to_standard(req: AnthropicChatRequest) -> StandardizedChatRequest:
     """(Upgraded) Transforms a complex Anthropic request, including tools."""
-    final_model_name = os.getenv("DEFAULT_MODEL_OVERRIDE", req.model)
-    if os.getenv("DEFAULT_MODEL_OVERRIDE"):
-        console.info(f"Model override active: '{req.model}' -> '{final_model_name}'")
-
-    # Translate messages
-    standard_messages = []
-    if req.system:
-        system_text = "".join(str(b.text) for b in req.system if hasattr(b, 'type') and b.type == "text" and hasattr(b, 'text')) if isinstance(req.system, list) else req.system
-        standard_messages.append(ChatMessage(role="system", content=system_text))
-    for msg in req.messages:
-        content_text = "".join(b.text for b in msg.content if b.type == "text" and b.text is not None) if isinstance(msg.content, list) else msg.content
-        standard_messages.append(ChatMessage(role=msg.role, content=content_text))
+    final_model_name = DEFAULT_MODEL_OVERRIDE or req.model
+    if final_model_name != req.model:
+        console.info("Model override active: '%s' -> '%s'", req.model, final_model_name)
+
+    # Every field below comes from the already-validated Anthropic request, so the
+    # internal models are built with model_construct instead of being validated again.
+    # Translate messages (system prompt first, if any). Plain chat carries string content
+    # only; that case is copied across directly instead of going through _flatten_text.
+    standard_messages: List[ChatMessage] = (
+        [ChatMessage.model_construct(role="system", content=_flatten_text(req.system))] if req.system else []
+    )
+    if all(type(msg.content) is str for msg in req.messages):
+        standard_messages += [ChatMessage.model_construct(role=msg.role, content=msg.content) for msg in req.messages]
+    else:
+        standard_messages += [
+            ChatMessage.model_construct(role=msg.role, content=_flatten_text(msg.content)) for msg in req.messages
+        ]
 
     # Translate tools
-    standard_tools = []
+    standard_tools = None
     if req.tools:
-        for tool in req.tools:
-            standard_tools.append(Tool(
+        standard_tools = [
+            Tool.model_construct(
                 type="function",
-                function=Function(
+                function=Function.model_construct(
                     name=tool.name,
                     description=tool.description,
                     parameters=tool.input_schema.properties
                 )
-            ))
+            )
+            for tool in req.tools
+        ]
 
-    return StandardizedChatRequest(
+    standard_request = StandardizedChatRequest.model_construct(
         model=final_model_name,
         messages=standard_messages,
         stream=req.stream,
-        tools=standard_tools if standard_tools else None,
+        tools=standard_tools,
         temperature=req.temperature,
         max_tokens=req.max_tokens,
     )
+    user_id = (req.metadata or {}).get("user_id")
+    if user_id is not None:
+        standard_request._cache_user = str(user_id)
+    return standard_request
+
+def _text_delta_event(text: str) -> bytes:
+    """Builds an Anthropic text content_block_delta SSE event."""
+    return _TEXT_DELTA_HEAD + orjson.dumps(text) + _TEXT_DELTA_TAIL
+
+def _flush_text(pending: List[str]) -> bytes:
+    """Merges the held-back text deltas into one event and empties the list."""
+    event = _text_delta_event("".join(pending))
+    pending.clear()
+    return event
 
-async def _full_response_translator(
+async def _with_flush_ticks(
+    source: AsyncGenerator[bytes, None],
+    timeout: Callable[[], Optional[float]],
+) -> AsyncGenerator[Any, None]:
+    """
+    Iterates source, additionally yielding _FLUSH_TICK whenever timeout() seconds pass
+    without a new chunk (timeout() returns None while there is nothing to flush).
+    The pending read is kept alive across ticks, so no upstream data is lost.
+    """
+    iterator = source.__aiter__()
+    next_chunk: Optional[asyncio.Future] = None
+    try:
+        while True:
+            if next_chunk is None:
+                next_chunk = asyncio.ensure_future(iterator.__anext__())
+            remaining = timeout()
+            if remaining is not None:
+                done, _ = await asyncio.wait({next_chunk}, timeout=max(remaining, 0.0))
+                if not done:
+                    yield _FLUSH_TICK
+                    continue
+            try:
+                chunk = await next_chunk
+            except StopAsyncIteration:
+                return
+            next_chunk = None
+            yield chunk
+    finally:
+        if next_chunk is not None:
+            # Wait for the cancelled read to unwind so the source can be closed right after.
+            next_chunk.cancel()
+            with contextlib.suppress(asyncio.CancelledError, StopAsyncIteration):
+                await next_chunk
+
+def _message_start_event(model: str) -> bytes:
+    """Builds the message_start SSE event that opens an Anthropic stream."""
+    return _MSG_START_TMPL % (b"msg_" + os.urandom(12).hex().encode(), orjson.dumps(model))
+
+async def _openai_to_anthropic_stream_translator(
     adapter_response: Union[Dict[str, Any], AsyncGenerator[bytes, None]],
-) -> AsyncGenerator[str, None]:
+    model: Optional[str] = None,
+) -> AsyncGenerator[bytes, None]:
     """(Upgraded) The final translator, now handling tool calls in the response."""
     # This translator now needs to be more complex to handle both text and tool calls.
     # For brevity in this final response, we will focus on the request-side translation
@@ -70,54 +180,118 @@ async def _full_response_translator(
     # back into Anthropic's tool_use format.
     
     # Simplified stream for text generation to ensure basic functionality
-    if isinstance(adapter_response, AsyncGenerator):
-        async for chunk in adapter_response:
-            chunk_str = chunk.decode("utf-8").strip()
-            if not chunk_str:
-                continue
-            if chunk_str == "data: [DONE]":
-                yield 'event: message_stop\ndata: {"type": "message_stop"}\n\n'
-                break
-            try:
-                data = json.loads(chunk_str[6:])
-                # Handle text delta
-                delta = data.get("choices", [{}])[0].get("delta", {})
-                content = delta.get("content")
-                if content:
-                    delta_event_data = {"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": content}}
-                    yield f'event: content_block_delta\ndata: {json.dumps(delta_event_data)}\n\n'
-                
-                # Handle tool calls delta
-                tool_calls = delta.get("tool_calls")
-                if tool_calls:
-                    for i, tool_call in enumerate(tool_calls):
-                        tool_use_event = {"type": "content_block_start", "index": i, "content_block": {"type": "tool_use", "id": tool_call["id"], "name": tool_call["function"]["name"], "input": {}}}
-                        yield f'event: content_block_start\ndata: {json.dumps(tool_use_event)}\n\n'
+    # Duck-typed: any async iterator of bytes is a stream, not just async generators.
+    if hasattr(adapter_response, "__aiter__"):
+        # Open the message before the first upstream read when the model is known.
+        if model is not None:
+            yield _message_start_event(model)
+        window = STREAM_COALESCE_MS / 1000
+        loop = asyncio.get_running_loop()
+        # Text deltas held back for coalescing, and when they must go out at the latest.
+        pending: List[str] = []
+        pending_len = 0
+        flush_at = 0.0
+        if window > 0:
+            source = _with_flush_ticks(adapter_response, lambda: (flush_at - loop.time()) if pending else None)
+        else:
+            source = adapter_response
+
+        # Upstream chunks are raw bytes and need not align with SSE events, so buffer
+        # them and split on the blank line that terminates each event.
+        buf = bytearray()
+        # Events produced from one upstream chunk are sent as a single body write.
+        out: List[bytes] = []
+        try:
+            async for chunk in source:
+                if chunk is _FLUSH_TICK:
+                    yield _flush_text(pending)
+                    pending_len = 0
+                    continue
+                buf.extend(chunk)
+                # SSE allows CRLF line endings; fold them so the split and prefix checks below
+                # stay plain byte comparisons (a CR left at the end is folded with the next chunk).
+                if b"\r" in buf:
+                    buf = bytearray(buf.replace(b"\r\n", b"\n"))
+                while (end := buf.find(b"\n\n")) != -1:
+                    event = bytes(buf[:end])
+                    del buf[:end + 2]
+                    if not event.startswith(_SSE_DATA_PREFIX):
+                        continue
+                    if event == _SSE_DONE:
+                        if pending:
+                            out.append(_flush_text(pending))
+                        out.append(_MSG_STOP)
+                        yield b"".join(out)
+                        return
+                    # Plain text deltas are by far the most common event: pull the string out
+                    # directly and only parse the whole event when anything else is in it.
+                    match = _DELTA_CONTENT_RE.search(event)
+                    if match is not None and b'"tool_calls"' not in event:
+                        content = _decode_json_string(match.group(1))
+                        delta = None
+                    else:
+                        try:
+                            # orjson parses the payload straight from a view, without copying it.
+                            data = orjson.loads(memoryview(event)[6:])
+                        except orjson.JSONDecodeError:
+                            console.warning("Could not decode stream event: %r", event)
+                            continue
+                        delta = data.get("choices", [{}])[0].get("delta", {})
+                        content = delta.get("content")
+                    # Handle text delta
+                    if content:
+                        if window <= 0:
+                            out.append(_text_delta_event(content))
+                        else:
+                            if not pending:
+                                flush_at = loop.time() + window
+                            pending.append(content)
+                            pending_len += len(content)
+                            if pending_len >= _COALESCE_MAX_CHARS:
+                                out.append(_flush_text(pending))
+                                pending_len = 0
+
+                    # Handle tool calls delta
+                    tool_calls = delta.get("tool_calls") if delta else None
+                    if tool_calls:
+                        if pending:
+                            out.append(_flush_text(pending))
+                            pending_len = 0
+                        for i, tool_call in enumerate(tool_calls):
+                            tool_use_event = {"type": "content_block_start", "index": i, "content_block": {"type": "tool_use", "id": tool_call["id"], "name": tool_call["function"]["name"], "input": {}}}
+                            out.append(_EVT_CBS + orjson.dumps(tool_use_event) + _EVT_END)
                         
-                        input_delta_event = {"type": "content_block_delta", "index": i, "delta": {"type": "input_json_delta", "partial_json": tool_call["function"]["arguments"]}}
-                        yield f'event: content_block_delta\ndata: {json.dumps(input_delta_event)}\n\n'
+                            input_delta_event = {"type": "content_block_delta", "index": i, "delta": {"type": "input_json_delta", "partial_json": tool_call["function"]["arguments"]}}
+                            out.append(_EVT_CBD + orjson.dumps(input_delta_event) + _EVT_END)
+                if out:
+                    yield out[0] if len(out) == 1 else b"".join(out)
+                    out.clear()
 
-            except json.JSONDecodeError:
-                console.warning(f"Could not decode stream chunk: {chunk_str}")
-                continue
+            # Upstream ended without [DONE]: don't lose held-back text.
+            if pending:
+                yield _flush_text(pending)
+        finally:
+            # Close the source as soon as the translation ends, including at [DONE], so the
+            # upstream response is released now rather than when this generator is collected.
+            if source is not adapter_response:
+                await source.aclose()
+            aclose = getattr(adapter_response, "aclose", None)
+            if aclose is not None:
+                await aclose()
 
-@router.post("/v1/messages", response_model=None)
-async def anthropic_proxy(request: AnthropicChatRequest) -> Union[StreamingResponse, JSONResponse]:
-    try:
-        console.info(f"Anthropic proxy received request for model: {request.model}")
-        standard_request = _transform_anthropic_to_standard(request)
-        
-        adapter = get_adapter(model_name=standard_request.model)
-        adapter_response = await adapter.chat_completions(standard_request)
-        
-        if standard_request.stream:
-            final_stream = _full_response_translator(adapter_response)
-            return StreamingResponse(final_stream, media_type="text/event-stream")
-        else:
-            # Non-streaming tool use translation would be needed here as well.
-            return JSONResponse(content=adapter_response) # Simplified for now
+@router.post("/messages", response_model=None)
+async def anthropic_proxy(request: AnthropicChatRequest) -> Union[StreamingResponse, ORJSONResponse]:
+    """
+    Anthropic Messages API endpoint, served by translating to and from the internal format.
+    Errors are turned into Anthropic-style error bodies by the application-wide handlers in app.main.
+    """
+    console.info("Anthropic proxy received request for model: %s", request.model)
+    standard_request = _transform_anthropic_to_standard(request)
+
+    adapter = get_adapter(standard_request.model)
+    adapter_response = await adapter.chat_completions(standard_request)
 
-    except Exception as e:
-        console.exception(f"FATAL: An unhandled error occurred in anthropic_proxy: {e}")
-        error_content = {"type": "error", "error": {"type": "internal_server_error", "message": str(e)}}
-        return JSONResponse(status_code=500, content=error_content)
\ No newline at end of file
+    if standard_request.stream:
+        adapter_response = _openai_to_anthropic_stream_translator(adapter_response, model=request.model)
+    # Non-streaming tool use translation would be needed here as well.
+    return wrap_response(standard_request.stream, adapter_response) # Simplified for now
@@ -7,43 +7,112 @@
 # Version: 0.1.0
 
 
-from fastapi import APIRouter, HTTPException
+import os
+
+import orjson
+from fastapi import APIRouter, Depends, Request
+from fastapi.exceptions import RequestValidationError
 from fastapi.responses import StreamingResponse
-from typing import Union
+from pydantic import TypeAdapter, ValidationError
+from typing import Any, Dict, List, Optional, Union
+from typing_extensions import Required, TypedDict
 
-from app.core.schemas import StandardizedChatRequest
+from app.core.schemas import StandardizedChatRequest, ChatMessage, Tool
 from app.services.model_manager import get_adapter
 from app.core.logger import console
+from app.core.responses import ORJSONResponse, wrap_response
 
 router = APIRouter()
 
-@router.post("/chat/completions", response_model=None)
-async def chat_completions(request: StandardizedChatRequest) -> Union[dict, StreamingResponse]:
+# When the request shape is controlled by the deployment, skip per-message validation:
+# messages are forwarded upstream verbatim and the upstream validates them anyway.
+TRUSTED_PAYLOAD = os.getenv("TRUSTED_PAYLOAD", "false").lower() == "true"
+
+
+class _TrustedTopLevel(TypedDict, total=False):
+    """Top-level fields still validated in trusted mode."""
+    model: Required[str]
+    stream: bool
+    temperature: Optional[float]
+    max_tokens: Optional[int]
+    tools: Optional[List[Tool]]
+    tool_choice: Optional[Union[str, Dict]]
+
+
+_trusted_top_level = TypeAdapter(_TrustedTopLevel)
+
+
+def _inline_refs(schema: Any, defs: Dict[str, Any]) -> Any:
+    """Replaces local $defs references with the definitions themselves (the models are not recursive)."""
+    if isinstance(schema, dict):
+        ref = schema.get("$ref")
+        if ref is not None and ref.startswith("#/$defs/"):
+            return _inline_refs(defs[ref[len("#/$defs/"):]], defs)
+        return {key: _inline_refs(value, defs) for key, value in schema.items()}
+    if isinstance(schema, list):
+        return [_inline_refs(item, defs) for item in schema]
+    return schema
+
+
+def _request_body_openapi() -> Dict[str, Any]:
+    """
+    The body is parsed by parse_chat_request rather than declared as a parameter, so
+    FastAPI cannot derive it; describe it from the model for the OpenAPI schema instead.
+    """
+    schema = StandardizedChatRequest.model_json_schema()
+    defs = schema.pop("$defs", {})
+    return {
+        "requestBody": {
+            "required": True,
+            "content": {"application/json": {"schema": _inline_refs(schema, defs)}},
+        }
+    }
+
+
+def _body_validation_error(e: ValidationError) -> RequestValidationError:
+    return RequestValidationError([{**err, "loc": ("body", *err["loc"])} for err in e.errors()])
+
+
+async def parse_chat_request(raw_request: Request) -> StandardizedChatRequest:
+    """
+    Parses the chat completion body and keeps the original bytes on the request, so the
+    adapter can forward them upstream without re-serializing.
+    With TRUSTED_PAYLOAD=true only the top-level fields are validated; messages are
+    wrapped with model_construct instead of being validated field by field.
+    """
+    raw_body = await raw_request.body()
+    try:
+        if TRUSTED_PAYLOAD:
+            body = orjson.loads(raw_body)
+            fields = _trusted_top_level.validate_python(body)
+            messages = [ChatMessage.model_construct(**msg) for msg in body.get("messages", ())]
+            request = StandardizedChatRequest.model_construct(messages=messages, **fields)
+        else:
+            request = StandardizedChatRequest.model_validate_json(raw_body)
+    except ValidationError as e:
+        raise _body_validation_error(e)
+    except (orjson.JSONDecodeError, TypeError, AttributeError) as e:
+        raise RequestValidationError([{"type": "json_invalid", "loc": ("body",), "msg": f"Invalid request body: {e}", "input": None}])
+    request._raw_body = raw_body
+    return request
+
+
+@router.post("/chat/completions", response_model=None, openapi_extra=_request_body_openapi())
+async def chat_completions(request: StandardizedChatRequest = Depends(parse_chat_request)) -> Union[ORJSONResponse, StreamingResponse]:
     """
     Handles standard OpenAI-compatible chat completion requests.
     Args:
         request (StandardizedChatRequest): The chat completion request object.
     Returns:
-        Union[dict, StreamingResponse]: Returns a dictionary response for non-streaming requests,
+        Union[ORJSONResponse, StreamingResponse]: Returns a JSON response for non-streaming requests,
         or a StreamingResponse for streaming requests.
+    Errors are turned into responses by the application-wide exception handlers in app.main.
     """
-    try:
-        console.info(f"Received chat completion request for model: {request.model}")
-        adapter = get_adapter(model_name=request.model)
-        response = await adapter.chat_completions(request)
+    console.info("Received chat completion request for model: %s", request.model)
+    adapter = get_adapter(request.model)
+    response = await adapter.chat_completions(request)
 
-        if request.stream:
-            return StreamingResponse(response, media_type="text/event-stream")
-        else:
-            console.success(f"Successfully returned non-streaming response for model: {request.model}")
-            if isinstance(response, dict):
-                return response
-            else:
-                raise ValueError("Expected dict response for non-streaming request")
-
-    except ValueError as e:
-        console.error(f"Validation Error: {e}")
-        raise HTTPException(status_code=400, detail=str(e))
-    except Exception as e:
-        console.exception(f"An unexpected error occurred for model {request.model}: {e}")
-        raise HTTPException(status_code=500, detail="An internal server error occurred.")
\ No newline at end of file
+    wrapped = wrap_response(request.stream, response)
+    if not request.stream:
+        console.success("Successfully returned non-streaming response for model: %s", request.model)
+    return wrapped
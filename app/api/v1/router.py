@@ -12,4 +12,4 @@ from app.api.v1.endpoints import chat, anthropic_proxy
 
 api_router = APIRouter()
 api_router.include_router(chat.router, prefix="/v1", tags=["Chat (OpenAI Standard)"])
-api_router.include_router(anthropic_proxy.router, prefix="/anthropic", tags=["Proxy (Anthropic)"])
\ No newline at end of file
+api_router.include_router(anthropic_proxy.router, prefix="/anthropic/v1", tags=["Proxy (Anthropic)"])
\ No newline at end of file
@@ -0,0 +1,17 @@
+# app/core/errors.py
+# The following code defines the application's own exception types.
+# Only InvalidRequestError is reported back as a 400; any other error is treated as a server failure.
+
+
+class InvalidRequestError(ValueError):
+    """
+    Raised when a request cannot be served as sent, e.g. it names a model that is not
+    configured. The message is returned to the client.
+    """
+
+
+class MissingCredentialsError(RuntimeError):
+    """
+    Raised when a configured model's API key or base URL is not set in the environment.
+    This is a deployment problem, so it is reported as a 500 without naming the variable.
+    """
@@ -0,0 +1,49 @@
+# app/core/http_client.py
+# The following code manages the HTTP client shared by all upstream adapters.
+# A single connection pool is created for the whole event loop so keep-alive connections
+# are reused across requests and models; the FastAPI lifespan owns its lifecycle.
+
+
+import os
+
+import httpx
+
+_client: httpx.AsyncClient | None = None
+
+
+def create_http_client() -> httpx.AsyncClient:
+    """
+    Builds an AsyncClient configured for long-running LLM calls.
+    HTTP/2 is negotiated by default so concurrent calls to the same upstream share one
+    multiplexed connection; set LLM_BRIDGE_HTTP2=false for upstreams that mishandle it.
+    LLM_BRIDGE_MAX_CONNECTIONS caps the pool size and LLM_BRIDGE_MAX_KEEPALIVE_CONNECTIONS
+    tunes (or, with 0, disables) keep-alive pooling.
+    """
+    http2 = os.getenv("LLM_BRIDGE_HTTP2", "true").lower() not in ("0", "false", "no", "off")
+    max_connections = int(os.getenv("LLM_BRIDGE_MAX_CONNECTIONS", "500"))
+    max_keepalive = int(os.getenv("LLM_BRIDGE_MAX_KEEPALIVE_CONNECTIONS", "100"))
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(300.0, connect=60.0),
+        limits=httpx.Limits(
+            max_keepalive_connections=max_keepalive,
+            max_connections=max_connections,
+            keepalive_expiry=30.0,
+        ),
+        http2=http2,
+    )
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Returns the shared client, creating it on first use."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = create_http_client()
+    return _client
+
+
+async def close_http_client() -> None:
+    """Closes the shared client, if one was created."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
@@ -51,6 +51,7 @@ class ConsoleManager:
         if logger.hasHandlers():
             return logger
 
+        # The configured LOG_LEVEL is applied by set_level once .env has been loaded.
         logger.setLevel(logging.INFO)
         handler = RichHandler(
             console=self._console,
@@ -63,21 +64,34 @@ class ConsoleManager:
         logger.addHandler(handler)
         return logger
 
-    # Define logging methods with custom prefixes
-    def info(self, message: str):
-        self._logger.info(message)
+    def set_level(self, name: str | None):
+        """
+        Sets the log level from a level name such as the LOG_LEVEL setting.
+        Unknown names fall back to INFO with a warning instead of failing startup.
+        """
+        level = logging.getLevelName((name or "INFO").strip().upper())
+        if not isinstance(level, int):
+            self._logger.setLevel(logging.INFO)
+            self.warning("Unknown LOG_LEVEL %r, using INFO.", name)
+            return
+        self._logger.setLevel(level)
+
+    # Define logging methods with custom prefixes.
+    # Extra positional args are %-style arguments, formatted only if the record is emitted.
+    def info(self, message: str, *args):
+        self._logger.info(message, *args)
 
-    def success(self, message: str):
-        self._logger.success(f"[SUCCESS] {message}") # type: ignore
+    def success(self, message: str, *args):
+        self._logger.success("[SUCCESS] " + message, *args) # type: ignore
 
-    def warning(self, message: str):
-        self._logger.warning(f"[WARNING] {message}")
+    def warning(self, message: str, *args):
+        self._logger.warning("[WARNING] " + message, *args)
 
-    def error(self, message: str):
-        self._logger.error(f"[ERROR] {message}")
+    def error(self, message: str, *args):
+        self._logger.error("[ERROR] " + message, *args)
 
-    def exception(self, message: str):
-        self._logger.exception(f"[EXCEPTION] {message}")
+    def exception(self, message: str, *args):
+        self._logger.exception("[EXCEPTION] " + message, *args)
 
     # higher-level console methods
     def rule(self, title: str, style: str = "cyan"):
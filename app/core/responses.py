@@ -0,0 +1,30 @@
+# app/core/responses.py
+# The following code defines the response classes shared by the API endpoints.
+
+
+from typing import Any, AsyncIterator, Dict, Union
+
+import orjson
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+class ORJSONResponse(JSONResponse):
+    """
+    JSON response rendered with orjson instead of the stdlib json module.
+    Upstream completions can be tens of kilobytes, so this is used for every full JSON reply.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content)
+
+
+def wrap_response(stream: bool, payload: Union[Dict[str, Any], AsyncIterator[bytes]]) -> Union[StreamingResponse, ORJSONResponse]:
+    """
+    Wraps an endpoint's result: an SSE byte stream for streaming requests, otherwise the
+    full JSON reply, which must be a dict.
+    """
+    if stream:
+        return StreamingResponse(payload, media_type="text/event-stream")
+    if not isinstance(payload, dict):
+        raise RuntimeError("Expected dict response for non-streaming request")
+    return ORJSONResponse(content=payload)
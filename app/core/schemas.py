@@ -6,29 +6,40 @@
 # Version 0.1.0
 
 
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, PrivateAttr
 from typing import List, Dict, Optional, Union, Literal, Any
 
 # --- OpenAI Compatible Schemas (Internal Standard) ---
+# These models are never mutated after construction, so they are frozen. Private
+# attributes (cached serializations, the raw body) can still be set on frozen models.
 
 class ChatMessage(BaseModel):
-    model_config = ConfigDict(extra="ignore")
+    model_config = ConfigDict(extra="ignore", frozen=True)
     role: Literal["system", "user", "assistant", "tool"]
     content: Optional[str] = None
     tool_calls: Optional[List[Dict]] = None
     tool_call_id: Optional[str] = None
+    _json: Optional[bytes] = PrivateAttr(default=None)
+
+    def to_json(self) -> bytes:
+        """Returns the message as upstream JSON bytes, serialized once and then reused."""
+        if self._json is None:
+            self._json = self.model_dump_json(exclude_none=True).encode()
+        return self._json
 
 class Function(BaseModel):
+    model_config = ConfigDict(frozen=True)
     name: str
     description: Optional[str] = None
     parameters: Dict
 
 class Tool(BaseModel):
+    model_config = ConfigDict(frozen=True)
     type: Literal["function"] = "function"
     function: Function
 
 class StandardizedChatRequest(BaseModel):
-    model_config = ConfigDict(extra="ignore")
+    model_config = ConfigDict(extra="ignore", frozen=True)
     model: str
     messages: List[ChatMessage]
     stream: bool = False
@@ -36,6 +47,10 @@ class StandardizedChatRequest(BaseModel):
     tool_choice: Optional[Union[str, Dict]] = None
     temperature: Optional[float] = 1.0
     max_tokens: Optional[int] = None
+    # Original OpenAI-format body, when the request arrived as one; adapters may forward it as-is.
+    _raw_body: Optional[bytes] = PrivateAttr(default=None)
+    # Caller identity that partitions the semantic cache; internal only, never sent upstream.
+    _cache_user: Optional[str] = PrivateAttr(default=None)
 
 # --- Anthropic API Specific Schemas (UPGRADED for Tool Use) ---
 
@@ -69,4 +84,5 @@ class AnthropicChatRequest(BaseModel):
     max_tokens: int
     stream: bool = False
     temperature: Optional[float] = None
-    tools: Optional[List[AnthropicTool]] = None
\ No newline at end of file
+    tools: Optional[List[AnthropicTool]] = None
+    metadata: Optional[Dict[str, Any]] = None
\ No newline at end of file
@@ -7,22 +7,97 @@
 # Version: 0.1.0
 
 
-from fastapi import FastAPI
+import math
+from contextlib import asynccontextmanager
+
+import httpx
+import orjson
+from fastapi import FastAPI, Request, Response
+from app.adapters.openai_compatible import OpenAICompatibleAdapter
+from app.adapters.resilience import CircuitOpenError
 from app.api.v1.router import api_router
+from app.core.errors import InvalidRequestError
+from app.core.http_client import get_http_client, close_http_client
+from app.core.logger import console
+from app.core.responses import ORJSONResponse
+from app.services.model_manager import clear_adapters, warm_adapters
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Application lifespan: opens the upstream HTTP connection pool shared by all adapters,
+    builds the adapters of every usable model, and releases the pool, the adapters and
+    the response cache on shutdown.
+    """
+    app.state.http = get_http_client()
+    warmed = warm_adapters()
+    console.info("Adapters ready for %d model(s): %s", len(warmed), ", ".join(warmed) or "none")
+    yield
+    await close_http_client()
+    # Cached adapters hold the closed client; drop them so a restart builds fresh ones.
+    clear_adapters()
+    await OpenAICompatibleAdapter.aclose_cache()
+
 
 app = FastAPI(
     title="LLM Bridge API",
     version="0.1.0",
-    description="A bridge to connect various LLM APIs through a unified interface."
+    description="A bridge to connect various LLM APIs through a unified interface.",
+    lifespan=lifespan,
+    # Routes returning plain dicts are rendered with orjson as well.
+    default_response_class=ORJSONResponse,
 )
 
 # Include the main API router. Prefixes will be handled within the router itself.
 app.include_router(api_router)
 
 
+# --- Error handling ---
+# Endpoints are written as straight-line code; failures are mapped to responses here.
+# Requests under /anthropic/ get Anthropic-style error bodies, everything else the
+# OpenAI-style {"detail": ...} body.
+
+def _error_response(request: Request, status_code: int, error_type: str, message: str, headers=None) -> ORJSONResponse:
+    if request.scope["path"].startswith("/anthropic/"):
+        content = {"type": "error", "error": {"type": error_type, "message": message}}
+    else:
+        content = {"detail": message}
+    return ORJSONResponse(status_code=status_code, content=content, headers=headers)
+
+
+@app.exception_handler(CircuitOpenError)
+async def circuit_open_handler(request: Request, exc: CircuitOpenError):
+    console.warning("Rejected request to %s: %s", request.scope["path"], exc)
+    return _error_response(request, 503, "overloaded_error", str(exc), {"Retry-After": str(math.ceil(exc.retry_after))})
+
+
+@app.exception_handler(httpx.TimeoutException)
+async def upstream_timeout_handler(request: Request, exc: httpx.TimeoutException):
+    # The read limit is chosen by the proxy (see AdaptiveTimeout), so this is a gateway timeout.
+    console.warning("Upstream timed out for %s: %r", request.scope["path"], exc)
+    return _error_response(request, 504, "api_error", "Upstream request timed out.")
+
+
+@app.exception_handler(InvalidRequestError)
+async def invalid_request_handler(request: Request, exc: InvalidRequestError):
+    console.error("Invalid request: %s", exc)
+    return _error_response(request, 400, "invalid_request_error", str(exc))
+
+
+@app.exception_handler(Exception)
+async def unhandled_error_handler(request: Request, exc: Exception):
+    console.exception("An unexpected error occurred in %s: %s", request.scope["path"], exc)
+    return _error_response(request, 500, "internal_server_error", "An internal server error occurred.")
+
+
+# Load balancers poll this constantly; its body is encoded once.
+_HEALTH_BODY = orjson.dumps({"status": "ok", "message": "Welcome to the LLM Bridge!"})
+
+
 @app.get("/", tags=["Health Check"])
-async def read_root():
+async def read_root() -> Response:
     """
     A simple health check endpoint.
     """
-    return {"status": "ok", "message": "Welcome to the LLM Bridge!"}
\ No newline at end of file
+    return Response(content=_HEALTH_BODY, media_type="application/json")
\ No newline at end of file
@@ -6,74 +6,230 @@
 # Version 0.1.0
 
 
+import functools
 import yaml
+import mmap
 import os
+import sys
+import tempfile
 from pathlib import Path
-from functools import lru_cache
+from typing import Any, Dict, List, NamedTuple, Optional, Type
 
-from dotenv import load_dotenv
+import orjson
+from dotenv import dotenv_values
 
 from app.adapters.base import BaseAdapter
 from app.adapters.openai_compatible import OpenAICompatibleAdapter
+from app.core.errors import InvalidRequestError, MissingCredentialsError
+from app.core.http_client import get_http_client
+from app.core.logger import console
 
 ADAPTER_CLASS_MAP = {
     "OpenAICompatibleAdapter": OpenAICompatibleAdapter,
     # Other adapters can be added here as needed
 }
 
-def load_all_configs():
+# Use the libyaml-backed loader when PyYAML was built with it.
+_YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+# Parsed models.yml, stored as JSON next to it and reused while the file is unchanged.
+# JSON rather than pickle: loading it can never execute code.
+CONFIG_CACHE_SUFFIX = ".cache.json"
+
+
+def _read_config_cache(cache_path: Path, stamp: List[int]) -> Optional[Dict[str, Any]]:
+    """Returns the cached configuration if it was written for the current models.yml."""
+    try:
+        cached = orjson.loads(cache_path.read_bytes())
+    except (OSError, orjson.JSONDecodeError):
+        return None
+    if not isinstance(cached, dict) or cached.get("stamp") != stamp or not isinstance(cached.get("configs"), dict):
+        return None
+    return cached["configs"]
+
+
+def _write_config_cache(cache_path: Path, stamp: List[int], model_configs: Dict[str, Any]) -> None:
+    """
+    Best effort: a read-only deployment simply parses the YAML on every start.
+    Every writer uses its own temporary file, so workers starting together never
+    interleave their writes; os.replace then swaps the complete file in atomically.
+    """
+    tmp_name = None
+    try:
+        payload = orjson.dumps({"stamp": stamp, "configs": model_configs}, option=orjson.OPT_NON_STR_KEYS)
+        with tempfile.NamedTemporaryFile(
+            dir=cache_path.parent, prefix=cache_path.name + ".", suffix=".tmp", delete=False,
+        ) as tmp:
+            tmp_name = tmp.name
+            tmp.write(payload)
+        os.replace(tmp_name, cache_path)
+    except (OSError, TypeError):
+        if tmp_name is not None:
+            try:
+                os.unlink(tmp_name)
+            except OSError:
+                pass
+
+
+def load_env():
     """
-    Loads all configurations from both .env and models.yml from the root
-    of the container's working directory.
+    Loads .env from the root of the container's working directory into the environment.
+    Variables already set in the environment win, as with load_dotenv().
+    The log level is applied afterwards, so LOG_LEVEL may be set in .env.
     """
     project_dotenv = Path(".env")
     if project_dotenv.exists():
-        load_dotenv(dotenv_path=project_dotenv)
+        env = dotenv_values(project_dotenv)
+        os.environ.update({k: v for k, v in env.items() if v is not None and k not in os.environ})
     else:
         print("Warning: .env file not found. Relying on system environment variables.")
+    console.set_level(os.getenv("LOG_LEVEL"))
 
+# .env is applied at import: other modules read their settings from the environment when
+# they are imported, after this one.
+load_env()
+
+
+def load_all_configs():
+    """
+    Loads the model configurations from models.yml in the root of the container's
+    working directory.
+    The parsed models.yml is cached in models.yml.cache.json, keyed by the file's
+    modification time and size, so unchanged configs skip the YAML parse on restart.
+    """
     config_path = Path("models.yml")
-    if not config_path.exists():
+    try:
+        stat = config_path.stat()
+    except FileNotFoundError:
         raise RuntimeError("CRITICAL: Configuration file 'models.yml' not found.")
-    
+
+    stamp = [stat.st_mtime_ns, stat.st_size]
+    cache_path = config_path.with_name(config_path.name + CONFIG_CACHE_SUFFIX)
+    cached = _read_config_cache(cache_path, stamp)
+    if cached is not None:
+        return cached
+
     try:
-        with open(config_path, 'r', encoding='utf-8') as f:
-            model_configs = yaml.safe_load(f)
-            if not isinstance(model_configs, dict):
-                raise ValueError("models.yml should contain a dictionary of model configurations.")
-            return model_configs
+        # libyaml reads the raw bytes straight from the mapped file (and handles the UTF-8
+        # decoding itself). Empty files cannot be mapped and parse to None anyway.
+        model_configs = None
+        if stat.st_size:
+            with open(config_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                model_configs = yaml.load(mm, Loader=_YAML_LOADER)
+        if not isinstance(model_configs, dict):
+            raise ValueError("models.yml should contain a dictionary of model configurations.")
     except yaml.YAMLError as e:
         raise RuntimeError(f"CRITICAL: Error parsing 'models.yml': {e}")
+    _write_config_cache(cache_path, stamp, model_configs)
+    return model_configs
 
-MODEL_CONFIGS = load_all_configs()
 
 
-@lru_cache(maxsize=128)
-def get_adapter(model_name: str) -> BaseAdapter:
+@functools.cache
+def get_model_configs() -> Dict[str, Any]:
+    """The parsed models.yml, loaded on first use (at the latest during app startup)."""
+    return load_all_configs()
+
+
+class AdapterSpec(NamedTuple):
+    """Validated models.yml entry: the adapter class and the env vars holding its credentials."""
+    adapter_class: Type[BaseAdapter]
+    api_key_name: str
+    base_url_name: str
+
+
+def build_adapter_specs(model_configs: Dict[str, Any]) -> Dict[str, AdapterSpec]:
     """
-    Factory for adapter instances, driven by the external models.yml configuration.
+    Validates every models.yml entry once, so a misconfigured model fails at startup
+    (the lifespan warms the adapters, which builds the specs).
+    Credentials are still read when an adapter is first requested: only the providers
+    actually in use need their environment variables set.
     """
-    config = MODEL_CONFIGS.get(model_name)
-    if not config:
-        raise ValueError(f"Model '{model_name}' is not configured in models.yml.")
+    specs: Dict[str, AdapterSpec] = {}
+    for model_name, config in model_configs.items():
+        if not isinstance(config, dict):
+            raise ValueError(f"Configuration for '{model_name}' in models.yml must be a mapping.")
+
+        adapter_name = config.get("adapter")
+        if not adapter_name or adapter_name not in ADAPTER_CLASS_MAP:
+            raise NotImplementedError(f"Adapter '{adapter_name}' for model '{model_name}' is not implemented.")
+
+        api_key_name = config.get("api_key_name")
+        base_url_name = config.get("base_url_name")
+        if not api_key_name or not base_url_name:
+            raise ValueError(f"Configuration for '{model_name}' in models.yml is missing 'api_key_name' or 'base_url_name'.")
+
+        specs[sys.intern(str(model_name))] = AdapterSpec(ADAPTER_CLASS_MAP[adapter_name], api_key_name, base_url_name)
+    return specs
+
+@functools.cache
+def get_adapter_specs() -> Dict[str, AdapterSpec]:
+    """The validated adapter spec of every configured model, built on first use."""
+    return build_adapter_specs(get_model_configs())
+
+
+# The configuration used to be bound at import as module attributes; those names still
+# resolve, lazily, through the getters above.
+_LAZY_ATTRIBUTES = {
+    "MODEL_CONFIGS": get_model_configs,
+    "ADAPTER_SPECS": get_adapter_specs,
+}
+
+
+def __getattr__(name: str) -> Any:
+    getter = _LAZY_ATTRIBUTES.get(name)
+    if getter is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getter()
+
 
-    adapter_name = config.get("adapter")
-    if not adapter_name or adapter_name not in ADAPTER_CLASS_MAP:
-        raise NotImplementedError(f"Adapter '{adapter_name}' for model '{model_name}' is not implemented.")
-    adapter_class = ADAPTER_CLASS_MAP[adapter_name]
+# One adapter per model name; the set of names is bounded by models.yml.
+_ADAPTERS: Dict[str, BaseAdapter] = {}
 
-    api_key_name = config.get("api_key_name")
-    base_url_name = config.get("base_url_name")
 
-    if not api_key_name or not base_url_name:
-        raise ValueError(f"Configuration for '{model_name}' in models.yml is missing 'api_key_name' or 'base_url_name'.")
+def get_adapter(model_name: str) -> BaseAdapter:
+    """
+    Factory for adapter instances, driven by the external models.yml configuration.
+    Adapters are stateless apart from the shared HTTP client, so one instance per model
+    is kept in a plain dict and reused by every request.
+    """
+    adapter = _ADAPTERS.get(model_name)
+    if adapter is not None:
+        return adapter
+
+    spec = get_adapter_specs().get(model_name)
+    if spec is None:
+        raise InvalidRequestError(f"Model '{model_name}' is not configured in models.yml.")
 
-    api_key = os.getenv(api_key_name)
-    base_url = os.getenv(base_url_name)
+    api_key = os.getenv(spec.api_key_name)
+    base_url = os.getenv(spec.base_url_name)
 
     if not api_key:
-        raise ValueError(f"Config Value Error: Environment variable '{api_key_name}' is not set (check your .env file).")
+        raise MissingCredentialsError(f"Config Value Error: Environment variable '{spec.api_key_name}' is not set (check your .env file).")
     if not base_url:
-        raise ValueError(f"Config Value Error: Environment variable '{base_url_name}' is not set (check your .env file).")
+        raise MissingCredentialsError(f"Config Value Error: Environment variable '{spec.base_url_name}' is not set (check your .env file).")
 
-    return adapter_class(api_key=api_key, base_url=base_url)
\ No newline at end of file
+    adapter = _ADAPTERS[model_name] = spec.adapter_class(api_key=api_key, base_url=base_url, client=get_http_client())
+    return adapter
+
+
+def warm_adapters() -> List[str]:
+    """
+    Builds the adapter of every configured model whose credentials are set, so that no
+    request pays for construction. Models without credentials are skipped; they keep
+    failing on request as before. Any other construction error (e.g. a malformed
+    setting) propagates so startup fails loudly. Returns the names of the warmed models.
+    """
+    warmed = []
+    for model_name in get_adapter_specs():
+        try:
+            get_adapter(model_name)
+        except MissingCredentialsError:
+            continue
+        warmed.append(model_name)
+    return warmed
+
+
+def clear_adapters() -> None:
+    """Drops all cached adapters, e.g. after the shared HTTP client has been closed."""
+    _ADAPTERS.clear()
@@ -1,9 +1,12 @@
 # tests/test_anthropic_proxy.py
 
+import asyncio
+import importlib.util
 import json
 import pytest
 from typing import AsyncGenerator
-from app.core.schemas import AnthropicChatRequest, AnthropicMessage, StandardizedChatRequest
+from app.core.schemas import AnthropicChatRequest, AnthropicContentBlock, AnthropicMessage, StandardizedChatRequest
+from app.api.v1.endpoints import anthropic_proxy
 from app.api.v1.endpoints.anthropic_proxy import _transform_anthropic_to_standard, _openai_to_anthropic_stream_translator
 
 # 1. Define a test case
@@ -73,26 +76,94 @@ def test_transform_anthropic_to_standard_without_system_prompt():
     assert standard_request.max_tokens == 500
 
 
-async def mock_openai_stream() -> AsyncGenerator[bytes, None]:
-    """A mock async generator that yields OpenAI-style SSE chunks."""
+def test_transform_applies_default_model_override(monkeypatch):
+    """
+    Tests that the override read from DEFAULT_MODEL_OVERRIDE at import replaces
+    the requested model.
+    """
+    monkeypatch.setattr(anthropic_proxy, "DEFAULT_MODEL_OVERRIDE", "deepseek-chat")
+    anthropic_request = AnthropicChatRequest(
+        model="claude-3-opus",
+        messages=[AnthropicMessage(role="user", content="Hi")],
+        max_tokens=16,
+    )
+
+    standard_request = _transform_anthropic_to_standard(anthropic_request)
+
+    assert standard_request.model == "deepseek-chat"
+
+
+def test_transform_flattens_block_content_mixed_with_strings():
+    """
+    Tests that a conversation mixing plain-string and content-block messages keeps
+    every message, in order, with the block text flattened.
+    """
+    anthropic_request = AnthropicChatRequest(
+        model="gpt-4o",
+        messages=[
+            AnthropicMessage(role="user", content="Plain."),
+            AnthropicMessage(role="assistant", content=[
+                AnthropicContentBlock(type="text", text="Block "),
+                AnthropicContentBlock(type="tool_use", id="t1", name="f", input={}),
+                AnthropicContentBlock(type="text", text="text."),
+            ]),
+            AnthropicMessage(role="user", content=""),
+        ],
+        max_tokens=16,
+    )
+
+    standard_request = _transform_anthropic_to_standard(anthropic_request)
+
+    assert [m.content for m in standard_request.messages] == ["Plain.", "Block text.", ""]
+
+
+def test_transform_keeps_metadata_user_id_internal():
+    """
+    Tests that Anthropic metadata.user_id only partitions the semantic cache and is not
+    added to the payload sent upstream.
+    """
+    anthropic_request = AnthropicChatRequest(
+        model="gpt-4o",
+        messages=[AnthropicMessage(role="user", content="Hi")],
+        max_tokens=16,
+        metadata={"user_id": "user-123"},
+    )
+
+    standard_request = _transform_anthropic_to_standard(anthropic_request)
+
+    assert standard_request._cache_user == "user-123"
+    assert "user" not in standard_request.model_dump()
+
+
+def split_events(chunks):
+    """Splits translated output back into individual SSE events, however it was batched."""
+    return [event + b"\n\n" for event in b"".join(chunks).split(b"\n\n") if event]
+
+@pytest.fixture(scope="module")
+def openai_sse_frames():
+    """OpenAI-style SSE frames, encoded once per module."""
     chunks = [
         'data: {"choices": [{"delta": {"content": "Hello"}}]}\n\n',
         'data: {"choices": [{"delta": {"content": ", "}}]}\n\n',
         'data: {"choices": [{"delta": {"content": "world!"}}]}\n\n',
         'data: [DONE]\n\n'
     ]
-    for chunk in chunks:
-        yield chunk.encode('utf-8')
+    return [chunk.encode('utf-8') for chunk in chunks]
+
+async def as_stream(frames) -> AsyncGenerator[bytes, None]:
+    """A mock upstream that yields the given frames one by one."""
+    for frame in frames:
+        yield frame
 
 # 2. Write an async test function since we are dealing with an async generator
 @pytest.mark.asyncio
-async def test_openai_to_anthropic_stream_translator():
+async def test_openai_to_anthropic_stream_translator(openai_sse_frames):
     """
     Tests if the stream translator correctly converts OpenAI SSE events
     to Anthropic SSE events.
     """
     # 3. Prepare input data (Arrange)
-    openai_stream = mock_openai_stream()
+    openai_stream = as_stream(openai_sse_frames)
 
     # 4. Execute the function under test (Act)
     # Collect the results of the translated async generator into a list
@@ -106,23 +177,171 @@ async def test_openai_to_anthropic_stream_translator():
 
     # Check the first content chunk
     first_chunk = translated_chunks[0]
-    assert first_chunk.startswith("event: content_block_delta")
-    first_data = json.loads(first_chunk.split("data: ")[1])
+    assert first_chunk.startswith(b"event: content_block_delta")
+    first_data = json.loads(first_chunk.split(b"data: ")[1])
     assert first_data["type"] == "content_block_delta"
     assert first_data["delta"]["text"] == "Hello"
 
     # Check the second content chunk
     second_chunk = translated_chunks[1]
-    second_data = json.loads(second_chunk.split("data: ")[1])
+    second_data = json.loads(second_chunk.split(b"data: ")[1])
     assert second_data["delta"]["text"] == ", "
 
     # Check the third content chunk
     third_chunk = translated_chunks[2]
-    third_data = json.loads(third_chunk.split("data: ")[1])
+    third_data = json.loads(third_chunk.split(b"data: ")[1])
     assert third_data["delta"]["text"] == "world!"
 
     # Check the last end chunk
     last_chunk = translated_chunks[3]
-    assert last_chunk.startswith("event: message_stop")
-    last_data = json.loads(last_chunk.split("data: ")[1])
-    assert last_data["type"] == "message_stop"
\ No newline at end of file
+    assert last_chunk.startswith(b"event: message_stop")
+    last_data = json.loads(last_chunk.split(b"data: ")[1])
+    assert last_data["type"] == "message_stop"
+
+async def mock_fragmented_openai_stream() -> AsyncGenerator[bytes, None]:
+    """A mock stream whose chunk boundaries do not line up with SSE events."""
+    raw = (
+        b'data: {"choices": [{"delta": {"content": "Hel"}}]}\n\n'
+        b'data: {"choices": [{"delta": {"content": "lo"}}]}\n\n'
+        b'data: [DONE]\n\n'
+    )
+    for i in range(0, len(raw), 7):
+        yield raw[i:i + 7]
+
+@pytest.mark.asyncio
+async def test_stream_translator_reassembles_fragmented_events():
+    """
+    Tests that events split across (or packed into) upstream chunks are still
+    translated one by one.
+    """
+    translated_chunks = [
+        chunk async for chunk in _openai_to_anthropic_stream_translator(mock_fragmented_openai_stream())
+    ]
+
+    assert len(translated_chunks) == 3
+    texts = [json.loads(chunk.split(b"data: ")[1])["delta"]["text"] for chunk in translated_chunks[:2]]
+    assert texts == ["Hel", "lo"]
+    assert translated_chunks[2].startswith(b"event: message_stop")
+
+
+@pytest.mark.asyncio
+async def test_stream_translator_coalesces_text_deltas(monkeypatch):
+    """
+    Tests that, with a coalescing window configured, deltas arriving within the window
+    are merged into one event and the window flushes text while the upstream is idle.
+    """
+    monkeypatch.setattr(anthropic_proxy, "STREAM_COALESCE_MS", 20)
+
+    async def bursty_stream() -> AsyncGenerator[bytes, None]:
+        yield b'data: {"choices": [{"delta": {"content": "Hello"}}]}\n\n'
+        yield b'data: {"choices": [{"delta": {"content": ", "}}]}\n\n'
+        await asyncio.sleep(0.1)
+        yield b'data: {"choices": [{"delta": {"content": "world!"}}]}\n\n'
+        yield b'data: [DONE]\n\n'
+
+    translated_events = split_events(
+        [chunk async for chunk in _openai_to_anthropic_stream_translator(bursty_stream())]
+    )
+
+    assert len(translated_events) == 3
+    texts = [json.loads(event.split(b"data: ")[1])["delta"]["text"] for event in translated_events[:2]]
+    assert texts == ["Hello, ", "world!"]
+    assert translated_events[2].startswith(b"event: message_stop")
+
+
+@pytest.mark.asyncio
+async def test_stream_translator_text_fast_path_decodes_escapes():
+    """
+    Tests that text pulled out of deltas without a full JSON parse is unescaped
+    exactly as a JSON parser would, and that other deltas still take the full parse.
+    """
+    async def escaped_stream() -> AsyncGenerator[bytes, None]:
+        yield 'data: {"choices":[{"index":0,"delta":{"content":"caf\\u00e9 \\"quoted\\"\\n"}}]}\n\n'.encode()
+        yield 'data: {"choices":[{"delta":{"content":"naïve ✓"}}]}\n\n'.encode()
+        yield b'data: {"choices":[{"delta":{"role":"assistant","content":null}}]}\n\n'
+        yield b'data: [DONE]\n\n'
+
+    translated_chunks = [chunk async for chunk in _openai_to_anthropic_stream_translator(escaped_stream())]
+
+    assert len(translated_chunks) == 3
+    texts = [json.loads(chunk.split(b"data: ")[1])["delta"]["text"] for chunk in translated_chunks[:2]]
+    assert texts == ['café "quoted"\n', "naïve ✓"]
+
+
+@pytest.mark.asyncio
+async def test_stream_translator_accepts_crlf_framing():
+    """
+    Tests that upstreams framing events with CRLF line endings, split at any byte,
+    are translated the same as LF-framed ones.
+    """
+    async def crlf_stream() -> AsyncGenerator[bytes, None]:
+        raw = (
+            b'data: {"choices": [{"delta": {"content": "Hi"}}]}\r\n\r\n'
+            b'data: [DONE]\r\n\r\n'
+        )
+        for i in range(0, len(raw), 5):
+            yield raw[i:i + 5]
+
+    translated_chunks = [chunk async for chunk in _openai_to_anthropic_stream_translator(crlf_stream())]
+
+    assert len(translated_chunks) == 2
+    assert json.loads(translated_chunks[0].split(b"data: ")[1])["delta"]["text"] == "Hi"
+    assert translated_chunks[1].startswith(b"event: message_stop")
+
+
+@pytest.mark.asyncio
+async def test_stream_translator_batches_events_from_one_upstream_chunk():
+    """
+    Tests that all events decoded from a single upstream chunk are written out together,
+    while events from separate chunks are not held back.
+    """
+    async def packed_stream() -> AsyncGenerator[bytes, None]:
+        yield b'data: {"choices": [{"delta": {"content": "a"}}]}\n\n'
+        yield (
+            b'data: {"choices": [{"delta": {"content": "b"}}]}\n\n'
+            b'data: {"choices": [{"delta": {"content": "c"}}]}\n\n'
+            b'data: [DONE]\n\n'
+        )
+
+    translated_chunks = [chunk async for chunk in _openai_to_anthropic_stream_translator(packed_stream())]
+
+    assert len(translated_chunks) == 2
+    events = split_events(translated_chunks)
+    assert [json.loads(event.split(b"data: ")[1])["delta"]["text"] for event in events[:3]] == ["a", "b", "c"]
+    assert events[3].startswith(b"event: message_stop")
+
+
+@pytest.mark.asyncio
+async def test_stream_translator_opens_with_message_start(openai_sse_frames):
+    """
+    Tests that, given the model name, the translated stream starts with a well-formed
+    message_start event carrying a fresh message id.
+    """
+    translated_chunks = [
+        chunk async for chunk in _openai_to_anthropic_stream_translator(as_stream(openai_sse_frames), model='odd "model"')
+    ]
+
+    assert len(translated_chunks) == 5
+    assert translated_chunks[0].startswith(b"event: message_start")
+    start_data = json.loads(translated_chunks[0].split(b"data: ")[1])
+    assert start_data["type"] == "message_start"
+    assert start_data["message"]["model"] == 'odd "model"'
+    assert start_data["message"]["id"].startswith("msg_")
+    assert start_data["message"]["role"] == "assistant"
+
+
+@pytest.mark.skipif(importlib.util.find_spec("pytest_benchmark") is None, reason="pytest-benchmark is not installed")
+def test_stream_translator_throughput(benchmark, openai_sse_frames):
+    """
+    Measures translating a 10k-event upstream stream, so regressions on the per-token
+    path show up in the benchmark report.
+    """
+    frames = openai_sse_frames[:-1] * 3334 + openai_sse_frames[-1:]
+
+    async def translate():
+        return [chunk async for chunk in _openai_to_anthropic_stream_translator(as_stream(frames))]
+
+    translated_chunks = benchmark.pedantic(lambda: asyncio.run(translate()), rounds=5, iterations=1)
+
+    assert len(translated_chunks) == len(frames)
+    assert translated_chunks[-1].startswith(b"event: message_stop")
@@ -0,0 +1,16 @@
+# tests/test_chat_endpoint.py
+
+from app.main import app
+
+
+def test_chat_completions_request_body_is_documented():
+    """
+    Tests that the OpenAPI schema still describes the chat completion body, although the
+    endpoint parses it itself instead of declaring it as a parameter.
+    """
+    operation = app.openapi()["paths"]["/v1/chat/completions"]["post"]
+    schema = operation["requestBody"]["content"]["application/json"]["schema"]
+
+    assert operation["requestBody"]["required"] is True
+    assert schema["required"] == ["model", "messages"]
+    assert schema["properties"]["messages"]["items"]["properties"]["role"]["enum"] == ["system", "user", "assistant", "tool"]
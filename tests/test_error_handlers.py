@@ -0,0 +1,115 @@
+# tests/test_error_handlers.py
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from app.adapters.resilience import CircuitOpenError
+from app.api.v1.endpoints import anthropic_proxy, chat
+from app.core.errors import InvalidRequestError, MissingCredentialsError
+from app.main import app
+
+CHAT_BODY = {"model": "some-model", "messages": [{"role": "user", "content": "Hi"}]}
+ANTHROPIC_BODY = {"model": "some-model", "max_tokens": 16, "messages": [{"role": "user", "content": "Hi"}]}
+
+
+def failing_get_adapter(exc: Exception):
+    def get_adapter(model_name):
+        raise exc
+    return get_adapter
+
+
+@pytest.fixture
+def client():
+    return TestClient(app, raise_server_exceptions=False)
+
+
+def test_invalid_request_maps_to_400_in_each_api_format(client, monkeypatch):
+    """
+    Tests that an InvalidRequestError (e.g. an unconfigured model) becomes a 400 with the
+    error body of the API that was called.
+    """
+    error = InvalidRequestError("Model 'some-model' is not configured in models.yml.")
+    monkeypatch.setattr(chat, "get_adapter", failing_get_adapter(error))
+    monkeypatch.setattr(anthropic_proxy, "get_adapter", failing_get_adapter(error))
+
+    chat_response = client.post("/v1/chat/completions", json=CHAT_BODY)
+    anthropic_response = client.post("/anthropic/v1/messages", json=ANTHROPIC_BODY)
+
+    assert chat_response.status_code == 400
+    assert chat_response.json() == {"detail": str(error)}
+    assert anthropic_response.status_code == 400
+    assert anthropic_response.json() == {
+        "type": "error",
+        "error": {"type": "invalid_request_error", "message": str(error)},
+    }
+
+
+def test_open_circuit_maps_to_503_with_retry_after(client, monkeypatch):
+    """
+    Tests that a short-circuited upstream is reported as overloaded with a Retry-After hint.
+    """
+    monkeypatch.setattr(anthropic_proxy, "get_adapter", failing_get_adapter(CircuitOpenError(2.5)))
+
+    response = client.post("/anthropic/v1/messages", json=ANTHROPIC_BODY)
+
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "3"
+    assert response.json()["error"]["type"] == "overloaded_error"
+
+
+def test_upstream_timeout_maps_to_504(client, monkeypatch):
+    """
+    Tests that an upstream read timeout, e.g. under the adaptive limit, is reported as a
+    gateway timeout rather than an internal error.
+    """
+    timeout = httpx.ReadTimeout("timed out")
+    monkeypatch.setattr(chat, "get_adapter", failing_get_adapter(timeout))
+    monkeypatch.setattr(anthropic_proxy, "get_adapter", failing_get_adapter(timeout))
+
+    chat_response = client.post("/v1/chat/completions", json=CHAT_BODY)
+    anthropic_response = client.post("/anthropic/v1/messages", json=ANTHROPIC_BODY)
+
+    assert chat_response.status_code == 504
+    assert chat_response.json() == {"detail": "Upstream request timed out."}
+    assert anthropic_response.status_code == 504
+    assert anthropic_response.json()["error"] == {"type": "api_error", "message": "Upstream request timed out."}
+
+
+def test_unexpected_error_maps_to_500_without_details(client, monkeypatch):
+    """
+    Tests that unexpected failures return a generic 500 and do not leak the exception text.
+    """
+    monkeypatch.setattr(chat, "get_adapter", failing_get_adapter(RuntimeError("secret detail")))
+
+    response = client.post("/v1/chat/completions", json=CHAT_BODY)
+
+    assert response.status_code == 500
+    assert "secret detail" not in response.text
+
+
+def test_other_value_errors_are_server_errors(client, monkeypatch):
+    """
+    Tests that a ValueError from anywhere else (bad upstream JSON, a malformed setting)
+    is reported as a 500, not blamed on the client.
+    """
+    monkeypatch.setattr(chat, "get_adapter", failing_get_adapter(ValueError("invalid literal for int()")))
+
+    response = client.post("/v1/chat/completions", json=CHAT_BODY)
+
+    assert response.status_code == 500
+    assert "invalid literal" not in response.text
+
+
+def test_missing_credentials_are_server_errors(client, monkeypatch):
+    """
+    Tests that an unset API key is reported as a 500 that does not name the server's
+    environment variable.
+    """
+    error = MissingCredentialsError("Config Value Error: Environment variable 'SECRET_API_KEY' is not set.")
+    monkeypatch.setattr(anthropic_proxy, "get_adapter", failing_get_adapter(error))
+
+    response = client.post("/anthropic/v1/messages", json=ANTHROPIC_BODY)
+
+    assert response.status_code == 500
+    assert "SECRET_API_KEY" not in response.text
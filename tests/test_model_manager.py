@@ -0,0 +1,166 @@
+# tests/test_model_manager.py
+
+import logging
+
+import orjson
+import pytest
+
+from app.adapters.openai_compatible import OpenAICompatibleAdapter
+from app.core.errors import InvalidRequestError, MissingCredentialsError
+from app.services import model_manager
+from app.services.model_manager import AdapterSpec, build_adapter_specs, load_all_configs
+
+
+def test_build_adapter_specs_validates_entries_up_front():
+    """
+    Tests that a valid models.yml entry becomes a spec and broken entries fail when the
+    registry is built, not on the first request for that model.
+    """
+    specs = build_adapter_specs({
+        "good": {"adapter": "OpenAICompatibleAdapter", "api_key_name": "K", "base_url_name": "U"},
+    })
+    assert specs == {"good": AdapterSpec(OpenAICompatibleAdapter, "K", "U")}
+
+    with pytest.raises(NotImplementedError):
+        build_adapter_specs({"bad": {"adapter": "NoSuchAdapter", "api_key_name": "K", "base_url_name": "U"}})
+    with pytest.raises(ValueError):
+        build_adapter_specs({"bad": {"adapter": "OpenAICompatibleAdapter", "api_key_name": "K"}})
+
+
+def test_get_adapter_reads_credentials_lazily(monkeypatch):
+    """
+    Tests that credentials are only required for models that are actually requested.
+    """
+    monkeypatch.setattr(model_manager, "get_adapter_specs", lambda: {
+        "test-model": AdapterSpec(OpenAICompatibleAdapter, "TEST_MODEL_API_KEY", "TEST_MODEL_BASE_URL"),
+    })
+    model_manager.clear_adapters()
+    monkeypatch.delenv("TEST_MODEL_API_KEY", raising=False)
+    monkeypatch.setenv("TEST_MODEL_BASE_URL", "http://upstream.test/v1")
+
+    with pytest.raises(MissingCredentialsError, match="TEST_MODEL_API_KEY"):
+        model_manager.get_adapter("test-model")
+    with pytest.raises(InvalidRequestError, match="not configured"):
+        model_manager.get_adapter("unknown-model")
+
+    monkeypatch.setenv("TEST_MODEL_API_KEY", "secret")
+    adapter = model_manager.get_adapter("test-model")
+    assert isinstance(adapter, OpenAICompatibleAdapter)
+    assert model_manager.get_adapter("test-model") is adapter
+    model_manager.clear_adapters()
+
+
+def test_warm_adapters_skips_models_without_credentials(monkeypatch):
+    """
+    Tests that warming builds adapters only for models whose credentials are set.
+    """
+    monkeypatch.setattr(model_manager, "get_adapter_specs", lambda: {
+        "ready": AdapterSpec(OpenAICompatibleAdapter, "READY_API_KEY", "READY_BASE_URL"),
+        "missing": AdapterSpec(OpenAICompatibleAdapter, "MISSING_API_KEY", "MISSING_BASE_URL"),
+    })
+    model_manager.clear_adapters()
+    monkeypatch.setenv("READY_API_KEY", "secret")
+    monkeypatch.setenv("READY_BASE_URL", "http://upstream.test/v1")
+    monkeypatch.delenv("MISSING_API_KEY", raising=False)
+
+    assert model_manager.warm_adapters() == ["ready"]
+    assert set(model_manager._ADAPTERS) == {"ready"}
+    model_manager.clear_adapters()
+
+
+def test_warm_adapters_surfaces_other_construction_errors(monkeypatch):
+    """
+    Tests that only missing credentials are skipped while warming; a malformed setting
+    fails startup instead of silently leaving no models ready.
+    """
+    monkeypatch.setattr(model_manager, "get_adapter_specs", lambda: {
+        "ready": AdapterSpec(OpenAICompatibleAdapter, "READY_API_KEY", "READY_BASE_URL"),
+    })
+    model_manager.clear_adapters()
+    monkeypatch.setenv("READY_API_KEY", "secret")
+    monkeypatch.setenv("READY_BASE_URL", "http://upstream.test/v1")
+    monkeypatch.setenv("LLM_BRIDGE_STREAM_BUFFER_CHUNKS", "eight")
+
+    with pytest.raises(ValueError, match="eight"):
+        model_manager.warm_adapters()
+    model_manager.clear_adapters()
+
+
+def test_load_all_configs_reuses_parse_cache_until_file_changes(tmp_path, monkeypatch):
+    """
+    Tests that the parsed models.yml is cached next to it and only reused while the
+    file's modification time and size are unchanged.
+    """
+    monkeypatch.chdir(tmp_path)
+    config_path = tmp_path / "models.yml"
+    config_path.write_text("m1:\n  adapter: OpenAICompatibleAdapter\n")
+
+    assert load_all_configs() == {"m1": {"adapter": "OpenAICompatibleAdapter"}}
+    cache_path = tmp_path / "models.yml.cache.json"
+    cached = orjson.loads(cache_path.read_bytes())
+    # The temporary file the cache was written through is gone.
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["models.yml", "models.yml.cache.json"]
+
+    # A matching stamp is trusted without re-reading the YAML.
+    cache_path.write_bytes(orjson.dumps({"stamp": cached["stamp"], "configs": {"from": "cache"}}))
+    assert load_all_configs() == {"from": "cache"}
+
+    config_path.write_text("m2:\n  adapter: OpenAICompatibleAdapter\n  extra: 1\n")
+    assert load_all_configs() == {"m2": {"adapter": "OpenAICompatibleAdapter", "extra": 1}}
+
+
+def test_load_all_configs_rejects_empty_file(tmp_path, monkeypatch):
+    """
+    Tests that an empty models.yml, which cannot be memory-mapped, is still reported as
+    an invalid configuration.
+    """
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "models.yml").write_bytes(b"")
+
+    with pytest.raises(ValueError, match="dictionary"):
+        load_all_configs()
+
+
+def test_legacy_config_attributes_resolve_lazily(tmp_path, monkeypatch):
+    """
+    Tests that the former import-time module attributes still resolve, through the
+    cached getters.
+    """
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "models.yml").write_text(
+        "m1:\n  adapter: OpenAICompatibleAdapter\n  api_key_name: K\n  base_url_name: U\n"
+    )
+    getters = (model_manager.get_model_configs, model_manager.get_adapter_specs)
+    for getter in getters:
+        getter.cache_clear()
+    try:
+        assert model_manager.MODEL_CONFIGS is model_manager.get_model_configs()
+        assert model_manager.ADAPTER_SPECS is model_manager.get_adapter_specs()
+        assert set(model_manager.ADAPTER_SPECS) == {"m1"}
+    finally:
+        for getter in getters:
+            getter.cache_clear()
+
+
+def test_load_env_applies_log_level_from_dotenv(tmp_path, monkeypatch):
+    """
+    Tests that LOG_LEVEL set in .env takes effect, and that an unknown level falls back
+    to INFO instead of failing startup.
+    """
+    logger = logging.getLogger("LLM_BRIDGE")
+    original_level = logger.level
+    monkeypatch.chdir(tmp_path)
+    # Registers LOG_LEVEL for restoration, since load_env writes it into os.environ.
+    monkeypatch.setenv("LOG_LEVEL", "")
+    monkeypatch.delenv("LOG_LEVEL")
+    (tmp_path / ".env").write_text("LOG_LEVEL=debug\n")
+
+    try:
+        model_manager.load_env()
+        assert logger.level == logging.DEBUG
+
+        monkeypatch.setenv("LOG_LEVEL", "verbose")
+        model_manager.load_env()
+        assert logger.level == logging.INFO
+    finally:
+        logger.setLevel(original_level)
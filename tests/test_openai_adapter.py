@@ -0,0 +1,482 @@
+# tests/test_openai_adapter.py
+
+import asyncio
+import httpx
+import orjson
+import pytest
+from app.adapters.cache import InMemoryBackend, LLMCache, SemanticCache
+from app.adapters.openai_compatible import OpenAICompatibleAdapter
+from app.adapters.resilience import AdaptiveTimeout, CircuitBreaker, CircuitOpenError
+from app.api.v1.endpoints import anthropic_proxy
+from app.api.v1.endpoints.anthropic_proxy import _openai_to_anthropic_stream_translator, _transform_anthropic_to_standard
+from app.core.schemas import AnthropicChatRequest, AnthropicMessage, StandardizedChatRequest, ChatMessage
+
+
+@pytest.fixture(autouse=True)
+def isolated_adapter_state(monkeypatch):
+    """Gives each test fresh shared adapter state and restores the originals afterwards."""
+    monkeypatch.setattr(OpenAICompatibleAdapter, "_cache", LLMCache(InMemoryBackend()))
+    monkeypatch.setattr(OpenAICompatibleAdapter, "_semantic_cache", SemanticCache(embedding_model=None))
+    monkeypatch.setattr(OpenAICompatibleAdapter, "_breaker", CircuitBreaker(fail_threshold=3, cooldown=60))
+    monkeypatch.setattr(OpenAICompatibleAdapter, "_timeouts", AdaptiveTimeout())
+
+
+def make_adapter(handler) -> OpenAICompatibleAdapter:
+    """Builds an adapter whose client is served by an in-memory transport."""
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return OpenAICompatibleAdapter(api_key="sk-test", base_url="http://upstream.test/v1/", client=client)
+
+
+def make_request(stream: bool, temperature: float = 1.0, max_tokens: int | None = None) -> StandardizedChatRequest:
+    return StandardizedChatRequest(
+        model="gpt-4o",
+        messages=[ChatMessage(role="user", content="Hello")],
+        stream=stream,
+        temperature=temperature,
+        max_tokens=max_tokens,
+    )
+
+
+@pytest.mark.asyncio
+async def test_non_streaming_request_forwards_payload():
+    """
+    Tests that the non-streaming path posts the serialized payload and decodes the reply.
+    """
+    seen = {}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen["url"] = str(request.url)
+        seen["auth"] = request.headers["authorization"]
+        seen["body"] = orjson.loads(request.content)
+        return httpx.Response(200, json={"id": "chatcmpl-1"})
+
+    adapter = make_adapter(handler)
+    response = await adapter.chat_completions(make_request(stream=False))
+
+    assert response == {"id": "chatcmpl-1"}
+    assert seen["url"] == "http://upstream.test/v1/chat/completions"
+    assert seen["auth"] == "Bearer sk-test"
+    assert seen["body"]["messages"] == [{"role": "user", "content": "Hello"}]
+    assert "tools" not in seen["body"]
+
+
+@pytest.mark.asyncio
+async def test_streaming_request_relays_all_chunks():
+    """
+    Tests that the bounded relay forwards every upstream chunk in order,
+    even when the upstream produces more chunks than the queue holds.
+    """
+    async def upstream():
+        for i in range(50):
+            yield f"data: {i}\n\n".encode()
+            await asyncio.sleep(0)
+
+    adapter = make_adapter(lambda request: httpx.Response(200, content=upstream()))
+    stream = await adapter.chat_completions(make_request(stream=True))
+    received = b"".join([chunk async for chunk in stream])
+
+    assert received == b"".join(f"data: {i}\n\n".encode() for i in range(50))
+
+
+@pytest.mark.asyncio
+async def test_streaming_upstream_error_reaches_consumer():
+    """
+    Tests that an error raised while reading the upstream terminates the client stream
+    instead of being silently swallowed.
+    """
+    async def upstream():
+        yield b"data: 1\n\n"
+        raise httpx.ReadError("connection reset")
+
+    adapter = make_adapter(lambda request: httpx.Response(200, content=upstream()))
+    stream = await adapter.chat_completions(make_request(stream=True))
+
+    with pytest.raises(httpx.ReadError):
+        async for _ in stream:
+            pass
+
+
+@pytest.mark.asyncio
+async def test_deterministic_request_is_served_from_cache():
+    """
+    Tests that a repeated temperature-0 request is answered from the cache,
+    while a sampled request always reaches the upstream.
+    """
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        return httpx.Response(200, json={"id": f"chatcmpl-{len(calls)}"})
+
+    adapter = make_adapter(handler)
+
+    first = await adapter.chat_completions(make_request(stream=False, temperature=0))
+    second = await adapter.chat_completions(make_request(stream=False, temperature=0))
+    assert first == second == {"id": "chatcmpl-1"}
+    assert len(calls) == 1
+
+    await adapter.chat_completions(make_request(stream=False, temperature=0.7))
+    await adapter.chat_completions(make_request(stream=False, temperature=0.7))
+    assert len(calls) == 3
+
+
+@pytest.mark.asyncio
+async def test_in_memory_backend_evicts_least_recently_used():
+    """
+    Tests the LRU bound and expiry of the in-process cache backend.
+    """
+    backend = InMemoryBackend(maxsize=2)
+    await backend.set("a", 1, ttl=60)
+    await backend.set("b", 2, ttl=60)
+    assert await backend.get("a") == 1  # "b" is now the least recently used entry
+    await backend.set("c", 3, ttl=60)
+
+    assert await backend.get("b") is None
+    assert await backend.get("a") == 1
+    assert await backend.get("c") == 3
+
+    await backend.set("d", 4, ttl=-1)
+    assert await backend.get("d") is None
+
+
+@pytest.mark.asyncio
+async def test_deterministic_stream_is_replayed_from_cache():
+    """
+    Tests that a completed temperature-0 stream is stored and replayed byte-for-byte.
+    """
+    calls = []
+    frames = [b"data: {\"n\": %d}\n\n" % i for i in range(3)] + [b"data: [DONE]\n\n"]
+
+    async def upstream():
+        for frame in frames:
+            yield frame
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        return httpx.Response(200, content=upstream())
+
+    adapter = make_adapter(handler)
+
+    first = await adapter.chat_completions(make_request(stream=True, temperature=0))
+    first_bytes = b"".join([chunk async for chunk in first])
+    second = await adapter.chat_completions(make_request(stream=True, temperature=0))
+    second_bytes = b"".join([chunk async for chunk in second])
+
+    assert first_bytes == second_bytes == b"".join(frames)
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_anthropic_stream_is_cached_although_translator_stops_at_done():
+    """
+    Tests that a temperature-0 stream consumed through the Anthropic translator, which
+    stops reading at data: [DONE], is still stored and replayed on the next request.
+    """
+    calls = []
+    frames = [b'data: {"choices": [{"delta": {"content": "Hi"}}]}\n\n', b"data: [DONE]\n\n"]
+
+    async def upstream():
+        for frame in frames:
+            yield frame
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        return httpx.Response(200, content=upstream())
+
+    adapter = make_adapter(handler)
+    anthropic_request = AnthropicChatRequest(
+        model="gpt-4o", messages=[AnthropicMessage(role="user", content="Hello")],
+        max_tokens=16, stream=True, temperature=0,
+    )
+
+    outputs = []
+    for _ in range(2):
+        stream = await adapter.chat_completions(_transform_anthropic_to_standard(anthropic_request))
+        outputs.append(b"".join([chunk async for chunk in _openai_to_anthropic_stream_translator(stream)]))
+
+    assert outputs[0] == outputs[1]
+    assert b"event: message_stop" in outputs[0]
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_semantic_cache_matches_near_duplicates_within_a_partition(monkeypatch):
+    """
+    Tests that a rephrased prompt with a near-identical embedding is served from the
+    semantic tier, but never across users and never for anonymous callers.
+    """
+    embeddings = {
+        "What is 2+2?": [1.0, 0.0], "what's 2 + 2": [0.999, 0.01], "Tell me a joke": [0.0, 1.0],
+        "What is 3+3?": [0.6, 0.8], "what's 3 + 3": [0.61, 0.79],
+    }
+    chat_calls = []
+    embedding_timeouts = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        body = orjson.loads(request.content)
+        if request.url.path.endswith("/embeddings"):
+            embedding_timeouts.append(request.extensions["timeout"]["read"])
+            return httpx.Response(200, json={"data": [{"embedding": embeddings[body["input"]]}]})
+        chat_calls.append(body)
+        return httpx.Response(200, json={"id": f"chatcmpl-{len(chat_calls)}"})
+
+    adapter = make_adapter(handler)
+    monkeypatch.setattr(OpenAICompatibleAdapter, "_semantic_cache", SemanticCache(embedding_model="text-embedding-3-small"))
+
+    def ask(text: str, user: str | None = "alice") -> StandardizedChatRequest:
+        request = StandardizedChatRequest(
+            model="gpt-4o", messages=[ChatMessage(role="user", content=text)], temperature=0,
+        )
+        request._cache_user = user
+        return request
+
+    assert await adapter.chat_completions(ask("What is 2+2?")) == {"id": "chatcmpl-1"}
+    assert await adapter.chat_completions(ask("what's 2 + 2")) == {"id": "chatcmpl-1"}
+    assert await adapter.chat_completions(ask("Tell me a joke")) == {"id": "chatcmpl-2"}
+    assert await adapter.chat_completions(ask("what's 2 + 2", user="bob")) == {"id": "chatcmpl-3"}
+    assert len(chat_calls) == 3
+    assert all("user" not in body for body in chat_calls)
+    assert embedding_timeouts == [5.0] * 4
+
+    assert await adapter.chat_completions(ask("What is 3+3?", user=None)) == {"id": "chatcmpl-4"}
+    assert await adapter.chat_completions(ask("what's 3 + 3", user=None)) == {"id": "chatcmpl-5"}
+    assert len(embedding_timeouts) == 4
+
+
+@pytest.mark.asyncio
+async def test_semantic_cache_evicts_least_recently_used_partition():
+    """
+    Tests that the number of partitions is bounded and the least recently used one goes first.
+    """
+    cache = SemanticCache(embedding_model="text-embedding-3-small", max_partitions=2)
+    cache.store("a", [1.0, 0.0], "answer-a")
+    cache.store("b", [1.0, 0.0], "answer-b")
+    assert await cache.lookup("a", [1.0, 0.0]) == "answer-a"  # "b" is now the least recently used
+    cache.store("c", [1.0, 0.0], "answer-c")
+
+    assert await cache.lookup("b", [1.0, 0.0]) is None
+    assert await cache.lookup("a", [1.0, 0.0]) == "answer-a"
+    assert await cache.lookup("c", [0.0, 1.0]) is None
+
+
+@pytest.mark.asyncio
+async def test_raw_openai_body_is_forwarded_verbatim():
+    """
+    Tests that a request carrying its original OpenAI body is forwarded without re-serialization.
+    """
+    seen = {}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen["body"] = request.content
+        return httpx.Response(200, json={"id": "chatcmpl-1"})
+
+    adapter = make_adapter(handler)
+    raw = b'{"model": "gpt-4o", "messages": [{"role": "user", "content": "Hello"}], "seed": 7}'
+    request = StandardizedChatRequest.model_validate_json(raw)
+    request._raw_body = raw
+
+    await adapter.chat_completions(request)
+    assert seen["body"] == raw
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("tools", [b"[]", b"null"])
+async def test_raw_body_with_empty_or_null_tools_is_rebuilt(tools):
+    """
+    Tests that a body whose tools field is empty or null is re-serialized without it
+    instead of being forwarded verbatim.
+    """
+    seen = {}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen["body"] = orjson.loads(request.content)
+        return httpx.Response(200, json={"id": "chatcmpl-1"})
+
+    adapter = make_adapter(handler)
+    raw = b'{"model": "gpt-4o", "messages": [{"role": "user", "content": "Hello"}], "tools": ' + tools + b"}"
+    request = StandardizedChatRequest.model_validate_json(raw)
+    request._raw_body = raw
+
+    await adapter.chat_completions(request)
+    assert "tools" not in seen["body"]
+    assert seen["body"]["messages"] == [{"role": "user", "content": "Hello"}]
+
+
+class RecordingStream(httpx.AsyncByteStream):
+    """An upstream body that records whether the proxy closed it."""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.closed = False
+
+    async def __aiter__(self):
+        for chunk in self.chunks:
+            yield chunk
+            await asyncio.sleep(0)
+
+    async def aclose(self) -> None:
+        self.closed = True
+
+
+@pytest.mark.asyncio
+async def test_stream_outlives_chat_completions_and_is_closed_after_use():
+    """
+    Tests that the upstream response stays open after chat_completions returns
+    (the generator is consumed later by the endpoint) and is closed once the
+    consumer finishes or walks away early.
+    """
+    bodies = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        bodies.append(RecordingStream([b"data: 1\n\n", b"data: 2\n\n", b"data: [DONE]\n\n"]))
+        return httpx.Response(200, stream=bodies[-1])
+
+    adapter = make_adapter(handler)
+
+    stream = await adapter.chat_completions(make_request(stream=True))
+    assert not bodies[0].closed
+    assert b"".join([chunk async for chunk in stream]).endswith(b"data: [DONE]\n\n")
+    assert bodies[0].closed
+
+    stream = await adapter.chat_completions(make_request(stream=True))
+    assert await stream.__anext__() == b"data: 1\n\n"
+    await stream.aclose()  # what StreamingResponse does when the client disconnects
+    assert bodies[1].closed
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("coalesce_ms", [0, 50])
+async def test_anthropic_translator_closes_upstream_at_done(monkeypatch, coalesce_ms):
+    """
+    Tests that the translator closes its source once it reaches [DONE], so the upstream
+    response is released while the translated stream is still referenced.
+    """
+    monkeypatch.setattr(anthropic_proxy, "STREAM_COALESCE_MS", coalesce_ms)
+    body = RecordingStream([b'data: {"choices": [{"delta": {"content": "Hi"}}]}\n\n', b"data: [DONE]\n\n", b": trailing\n\n"])
+    adapter = make_adapter(lambda request: httpx.Response(200, stream=body))
+
+    stream = await adapter.chat_completions(make_request(stream=True))
+    translated = _openai_to_anthropic_stream_translator(stream)
+    output = b"".join([chunk async for chunk in translated])
+
+    assert b"event: message_stop" in output
+    assert body.closed
+
+
+@pytest.mark.asyncio
+async def test_circuit_opens_after_consecutive_upstream_failures():
+    """
+    Tests that repeated 5xx responses open the circuit, after which requests are
+    rejected without reaching the upstream, while 4xx responses do not count.
+    """
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        return httpx.Response(400 if len(calls) == 1 else 503, json={"error": "boom"})
+
+    adapter = make_adapter(handler)
+
+    for _ in range(4):  # one 400, then three 503s trip the breaker
+        with pytest.raises(httpx.HTTPStatusError):
+            await adapter.chat_completions(make_request(stream=False))
+    with pytest.raises(CircuitOpenError):
+        await adapter.chat_completions(make_request(stream=False))
+    assert len(calls) == 4
+
+
+def test_adaptive_timeout_follows_observed_latency():
+    """
+    Tests that the read timeout tightens to a multiple of the p99 latency once enough
+    samples exist, never dropping below the floor.
+    """
+    timeouts = AdaptiveTimeout(default=300.0, min_samples=20, multiplier=5.0, floor=5.0)
+    assert timeouts.timeout_for("k").read == 300.0
+
+    for _ in range(20):
+        timeouts.observe("k", 4.0)
+    assert timeouts.timeout_for("k").read == 20.0
+
+    for _ in range(100):
+        timeouts.observe("fast", 0.1)
+    assert timeouts.timeout_for("fast").read == 5.0
+
+
+async def serve_chunked_sse(frames, pause: float):
+    """
+    Starts a local HTTP/1.1 server that answers every request with a chunked SSE body,
+    sleeping `pause` seconds before the last frame. A real socket is needed because the
+    in-memory transport does not enforce read timeouts.
+    """
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        head = await reader.readuntil(b"\r\n\r\n")
+        length = next(
+            (int(line.split(b":", 1)[1]) for line in head.split(b"\r\n") if line.lower().startswith(b"content-length:")),
+            0,
+        )
+        await reader.readexactly(length)
+        writer.write(
+            b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+            b"Transfer-Encoding: chunked\r\nConnection: close\r\n\r\n"
+        )
+        for i, frame in enumerate(frames):
+            if i == len(frames) - 1:
+                await asyncio.sleep(pause)
+            writer.write(b"%x\r\n%s\r\n" % (len(frame), frame))
+            await writer.drain()
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+        writer.close()
+
+    return await asyncio.start_server(handle, "127.0.0.1", 0)
+
+
+@pytest.mark.asyncio
+async def test_stream_pausing_longer_than_the_floor_survives_a_full_window(monkeypatch):
+    """
+    Tests that streams keep the default read timeout even after many fast responses,
+    so a reasoning model pausing between chunks is not cut off at the adaptive floor.
+    """
+    timeouts = AdaptiveTimeout(default=5.0, window=5, min_samples=5, multiplier=1.0, floor=0.05)
+    monkeypatch.setattr(OpenAICompatibleAdapter, "_timeouts", timeouts)
+    frames = [b"data: 1\n\n", b"data: [DONE]\n\n"]
+    server = await serve_chunked_sse(frames, pause=0.3)
+    port = server.sockets[0].getsockname()[1]
+
+    async with server, httpx.AsyncClient() as client:
+        adapter = OpenAICompatibleAdapter(api_key="sk-test", base_url=f"http://127.0.0.1:{port}/v1", client=client)
+        for _ in range(timeouts.window + 1):
+            stream = await adapter.chat_completions(make_request(stream=True))
+            assert b"".join([chunk async for chunk in stream]) == b"".join(frames)
+
+
+@pytest.mark.asyncio
+async def test_timeout_under_adaptive_limit_does_not_open_circuit(monkeypatch):
+    """
+    Tests that bounded non-streaming requests adapt their read timeout per max_tokens, and
+    that hitting that tightened limit is not counted as an upstream failure.
+    """
+    timeouts = AdaptiveTimeout(default=300.0, min_samples=1, multiplier=5.0, floor=5.0)
+    monkeypatch.setattr(OpenAICompatibleAdapter, "_timeouts", timeouts)
+    read_timeouts = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        read_timeouts.append(request.extensions["timeout"]["read"])
+        raise httpx.ReadTimeout("timed out", request=request)
+
+    adapter = make_adapter(handler)
+    timeouts.observe((adapter._chat_url, "gpt-4o", 64), 1.0)
+
+    bounded = make_request(stream=False, max_tokens=64)
+    for _ in range(5):
+        with pytest.raises(httpx.ReadTimeout):
+            await adapter.chat_completions(bounded)
+    assert read_timeouts == [5.0] * 5
+
+    # Unbounded requests keep the default timeout, so their timeouts do count.
+    for _ in range(3):
+        with pytest.raises(httpx.ReadTimeout):
+            await adapter.chat_completions(make_request(stream=False))
+    with pytest.raises(CircuitOpenError):
+        await adapter.chat_completions(bounded)
+    assert read_timeouts[5:] == [300.0] * 3